@@ -0,0 +1,284 @@
+"""
+scenario runner for smc modules: runs every scenario through Process.fullLifeCycle in a separate worker process
+scenario files (default *_scenarios.py) define a list "scenarios" of Scenario objects or dicts with keys
+name, module (module factory), settings, input, expected and timeout
+results are cached by a hash of module source, settings and input, unchanged scenarios are not run again
+usage: python ScenarioRunner.py [directory] [workers] [pattern]
+"""
+import hashlib
+import inspect
+import os
+import sys
+import time
+
+import SMCApi
+import SmcEmulator
+
+MYPY = False
+if MYPY:
+    from typing import Dict, List, Callable
+
+
+class Scenario(object):
+    def __init__(self, name, moduleFactory, settings=None, input=None, expected=None, timeout=None, fileName=None):
+        # type: (str, Callable[[], SMCApi.Module], Dict[str, object], List[List[object]], List[object], float, str) -> None
+        self.name = name
+        self.moduleFactory = moduleFactory
+        self.settings = dict(settings) if settings else {}
+        # each source is a list of actions, an action is an SMCApi.IAction or a list of values
+        self.input = list(input) if input else []
+        # values of DATA messages, None checks only that no ACTION_ERROR was produced
+        self.expected = expected
+        self.timeout = timeout
+        self.fileName = fileName
+        self.hash = None
+
+    def createAction(self, action):
+        # type: (object) -> SMCApi.IAction
+        if isinstance(action, SMCApi.IAction):
+            return action
+        if not isinstance(action, (list, tuple)):
+            action = [action]
+        return SmcEmulator.Action([m if isinstance(m, SMCApi.IMessage) else SmcEmulator.Message(SmcEmulator.Value(m)) for m in action])
+
+    def run(self):
+        # type: () -> List[SMCApi.IMessage]
+        settings = dict((key, value if isinstance(value, SmcEmulator.Value) else SmcEmulator.Value(value)) for key, value in self.settings.iteritems())
+        configurationTool = SmcEmulator.ConfigurationToolImpl(self.name, settings=settings)
+        executionContextTool = SmcEmulator.ExecutionContextToolImpl([[self.createAction(a) for a in actions] for actions in self.input])
+        return SmcEmulator.Process(configurationTool, self.moduleFactory()).fullLifeCycle(executionContextTool)
+
+    def check(self, messages):
+        # type: (List[SMCApi.IMessage]) -> str
+        errors = [m.getValue() for m in messages if m.getMessageType() == SMCApi.MessageType.ACTION_ERROR]
+        if errors:
+            return "action error: {}".format("; ".join(str(e) for e in errors))
+        if self.expected is None:
+            return None
+        values = [m.getValue() for m in messages if m.getMessageType() == SMCApi.MessageType.DATA]
+        for i in range(min(len(values), len(self.expected))):
+            if values[i] != self.expected[i]:
+                return "message {}: expected {!r}, got {!r}".format(i, self.expected[i], values[i])
+        if len(values) != len(self.expected):
+            return "expected {} messages, got {}".format(len(self.expected), len(values))
+        return None
+
+
+def sourceFileOf(obj):
+    # type: (object) -> str
+    pyModule = sys.modules.get(getattr(obj, "__module__", None))
+    fileName = getattr(pyModule, "__file__", None)
+    if fileName is None:
+        return None
+    if fileName.endswith(".pyc") or fileName.endswith(".pyo"):
+        fileName = fileName[:-1]
+    return os.path.abspath(fileName)
+
+
+def canonical(value):
+    # type: (object) -> str
+    # stable text form of settings and input for hashing
+    if isinstance(value, SMCApi.IAction):
+        return "A({},[{}])".format(value.getType().name, ",".join(canonical(m) for m in value.getMessages()))
+    if isinstance(value, SMCApi.IMessage):
+        return "M({},{},{})".format(value.getMessageType().name, value.getType().name, canonical(value.getValue()))
+    if isinstance(value, SMCApi.IValue):
+        return "V({},{})".format(value.getType().name, canonical(value.getValue()))
+    if isinstance(value, SMCApi.ObjectArray):
+        return "O({})".format(canonical([value.get(i) for i in range(value.size())]))
+    if isinstance(value, SMCApi.ObjectElement):
+        return "E({})".format(canonical([(f.getName(), f.getType().name, f.getValue()) for f in value.getFields()]))
+    if isinstance(value, dict):
+        return "{" + ",".join("{}:{}".format(canonical(k), canonical(value[k])) for k in sorted(value)) + "}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ",".join(canonical(v) for v in value) + "]"
+    return "{}:{!r}".format(type(value).__name__, value)
+
+
+def scenarioHash(scenario, sourceCache):
+    # type: (Scenario, Dict[str, str]) -> str
+    # the factory is not called here, module constructors run only in the workers
+    fileNames = set([sourceFileOf(scenario.moduleFactory), sourceFileOf(SmcEmulator), scenario.fileName])
+    if inspect.isclass(scenario.moduleFactory):
+        try:
+            fileNames.add(os.path.abspath(inspect.getsourcefile(scenario.moduleFactory)))
+        except TypeError:
+            pass
+    digest = hashlib.sha1()
+    for fileName in sorted(f for f in fileNames if f):
+        if fileName not in sourceCache:
+            try:
+                with open(fileName, "rb") as f:
+                    sourceCache[fileName] = hashlib.sha1(f.read()).hexdigest()
+            except IOError:
+                sourceCache[fileName] = ""
+        digest.update("{}={}\n".format(fileName, sourceCache[fileName]))
+    digest.update(canonical((scenario.name, scenario.settings, scenario.input, scenario.expected)))
+    return digest.hexdigest()
+
+
+def loadScenarios(directory, pattern="*_scenarios.py"):
+    # type: (str, str) -> List[Scenario]
+    import fnmatch
+    import imp
+    scenarios = []
+    directory = os.path.abspath(directory)
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for fileName in sorted(fnmatch.filter(files, pattern)):
+            path = os.path.join(root, fileName)
+            if root not in sys.path:
+                sys.path.insert(0, root)
+            pyModule = imp.load_source("scenarios_{}".format(hashlib.sha1(path).hexdigest()[:12]), path)
+            for scenario in getattr(pyModule, "scenarios", []):
+                if isinstance(scenario, dict):
+                    scenario = Scenario(scenario["name"], scenario["module"], scenario.get("settings"), scenario.get("input"),
+                                        scenario.get("expected"), scenario.get("timeout"))
+                scenario.fileName = path
+                scenarios.append(scenario)
+    return scenarios
+
+
+def runScenario(scenario):
+    # type: (Scenario) -> dict
+    startTime = time.time()
+    try:
+        messages = scenario.run()
+        error = scenario.check(messages)
+        result = {"status": "failed" if error else "passed", "message": error,
+                  "output": [[m.getMessageType().name, repr(m.getValue())] for m in messages]}
+    except Exception as e:
+        result = {"status": "error", "message": "{}: {}".format(type(e).__name__, e), "output": []}
+    result["seconds"] = time.time() - startTime
+    return result
+
+
+class ScenarioRunner(object):
+    def __init__(self, workers=None, cacheFile=".smc_scenario_cache.json", timeout=None):
+        # type: (int, str, float) -> None
+        if workers is None:
+            import multiprocessing
+            workers = multiprocessing.cpu_count()
+        self.workers = max(1, workers)
+        self.cacheFile = cacheFile
+        self.timeout = timeout
+        # type: Dict[str, dict]
+        self.cache = {}
+        if cacheFile and os.path.exists(cacheFile):
+            import json
+            with open(cacheFile) as f:
+                self.cache = json.load(f)
+
+    def saveCache(self):
+        if not self.cacheFile:
+            return
+        import json
+        fileName = "{}.{}".format(self.cacheFile, os.getpid())
+        with open(fileName, "w") as f:
+            json.dump(self.cache, f)
+        os.rename(fileName, self.cacheFile)
+
+    def run(self, scenarios):
+        # type: (List[Scenario]) -> List[dict]
+        sourceCache = {}
+        results = [None] * len(scenarios)
+        pending = []
+        for i, scenario in enumerate(scenarios):
+            scenario.hash = scenarioHash(scenario, sourceCache)
+            cached = self.cache.get(scenario.hash)
+            if cached is not None:
+                results[i] = dict(cached, name=scenario.name, cached=True)
+            else:
+                pending.append(i)
+        if not hasattr(os, "fork"):
+            for i in pending:
+                results[i] = runScenario(scenarios[i])
+        else:
+            self.runForked(scenarios, pending, results)
+        for i in pending:
+            result = results[i]
+            result["name"] = scenarios[i].name
+            result["cached"] = False
+            # worker failures (crash, timeout) are not cached, they may depend on the machine
+            if result["status"] != "error":
+                self.cache[scenarios[i].hash] = dict((k, v) for k, v in result.iteritems() if k not in ("name", "cached"))
+        self.saveCache()
+        return results
+
+    def runForked(self, scenarios, pending, results):
+        # type: (List[Scenario], List[int], List[dict]) -> None
+        import cPickle
+        import select
+        import signal
+        pending = list(reversed(pending))
+        # read fd -> [pid, scenario index, chunks, start time]
+        running = {}
+        while pending or running:
+            while pending and len(running) < self.workers:
+                index = pending.pop()
+                readFd, writeFd = os.pipe()
+                pid = os.fork()
+                if pid == 0:
+                    os.close(readFd)
+                    for fd in running:
+                        os.close(fd)
+                    try:
+                        data = cPickle.dumps(runScenario(scenarios[index]), cPickle.HIGHEST_PROTOCOL)
+                        writer = os.fdopen(writeFd, "wb")
+                        writer.write(data)
+                        writer.close()
+                    finally:
+                        # os._exit skips the flush of buffered module logs
+                        try:
+                            sys.stdout.flush()
+                            sys.stderr.flush()
+                        finally:
+                            os._exit(0)
+                os.close(writeFd)
+                running[readFd] = [pid, index, [], time.time()]
+            readable, _, _ = select.select(list(running), [], [], 0.1)
+            for fd in readable:
+                chunk = os.read(fd, 65536)
+                if chunk:
+                    running[fd][2].append(chunk)
+                    continue
+                pid, index, chunks, startTime = running.pop(fd)
+                os.close(fd)
+                os.waitpid(pid, 0)
+                try:
+                    results[index] = cPickle.loads("".join(chunks))
+                except Exception:
+                    results[index] = {"status": "error", "message": "worker exited without result", "output": [],
+                                      "seconds": time.time() - startTime}
+            now = time.time()
+            for fd, (pid, index, chunks, startTime) in running.items():
+                timeout = scenarios[index].timeout if scenarios[index].timeout is not None else self.timeout
+                if timeout is not None and now - startTime > timeout:
+                    os.kill(pid, signal.SIGKILL)
+                    os.waitpid(pid, 0)
+                    os.close(fd)
+                    del running[fd]
+                    results[index] = {"status": "error", "message": "timeout after {} s".format(timeout), "output": [],
+                                      "seconds": now - startTime}
+
+
+def main(directory=".", workers=None, pattern="*_scenarios.py"):
+    startTime = time.time()
+    scenarios = loadScenarios(directory, pattern)
+    results = ScenarioRunner(workers).run(scenarios)
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+        if result["status"] != "passed":
+            print "{} {}: {}".format(result["status"].upper(), result["name"], result["message"])
+    print "scenarios: {}, passed: {}, failed: {}, errors: {}, cached: {}, {:.2f} s".format(
+        len(results), counts.get("passed", 0), counts.get("failed", 0), counts.get("error", 0),
+        sum(1 for r in results if r["cached"]), time.time() - startTime)
+    return 0 if len(results) == counts.get("passed", 0) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1] if len(sys.argv) > 1 else ".", int(sys.argv[2]) if len(sys.argv) > 2 else None,
+                  sys.argv[3] if len(sys.argv) > 3 else "*_scenarios.py"))
@@ -2,14 +2,41 @@
 created by Nikolay V. Ulyanov (ulianownv@mail.ru)
 http://www.smcsystem.ru
 """
+import array
+import collections
 import datetime
+import itertools
+import math
 import os.path
-import tempfile
-import traceback
+import sys
+import time
+import weakref
 from __builtin__ import long, unicode
 
 import SMCApi
-from typing import Dict, List, Callable
+
+# copy, cPickle, gc, json, mmap, re, tempfile, threading and traceback are imported where they are used, typing only by type checkers
+# the opt-in tools live in their own modules: SmcGraph, SmcLoad, SmcMetrics, SmcOutput, SmcProfiler and SmcSnapshot
+MYPY = False
+if MYPY:
+    from typing import Dict, List, Callable, Iterator
+    from SmcMetrics import MetricsRegistry
+    from SmcOutput import TickHistory
+    from SmcProfiler import StackSampler
+
+tempDirectory = None
+
+# type: MetricsRegistry
+metrics = None
+
+
+def getTempDirectory():
+    # type: () -> str
+    global tempDirectory
+    if tempDirectory is None:
+        import tempfile
+        tempDirectory = tempfile.gettempdir()
+    return tempDirectory
 
 
 class Value(SMCApi.IValue):
@@ -33,6 +60,9 @@ class Value(SMCApi.IValue):
                 self.typev = SMCApi.ValueType.BOOLEAN
             elif valueType == SMCApi.ObjectArray:
                 self.typev = SMCApi.ValueType.OBJECT_ARRAY
+            elif valueType == ObjectArrayBuilder:
+                self.value = value.build()
+                self.typev = SMCApi.ValueType.OBJECT_ARRAY
             else:
                 raise ValueError("wrong type")
 
@@ -78,13 +108,41 @@ class Action(SMCApi.IAction):
         if typev is None:
             typev = SMCApi.ActionType.EXECUTE
         self.typev = typev
+        # type: Dict[SMCApi.MessageType, int]
+        self.typeCounts = {}
+        self.countedMessages = 0
 
     def getMessages(self):
+        # the caller may change the list in place, so the counts are rebuilt on the next getTypeCounts
+        self.countedMessages = -1
         return self.messages
 
+    def addMessage(self, message):
+        # type: (SMCApi.IMessage) -> None
+        counted = self.countedMessages == len(self.messages)
+        self.messages.append(message)
+        if counted:
+            messageType = message.getMessageType()
+            self.typeCounts[messageType] = self.typeCounts.get(messageType, 0) + 1
+            self.countedMessages += 1
+
     def getType(self):
         return self.typev
 
+    def getTypeCounts(self):
+        # type: () -> Dict[SMCApi.MessageType, int]
+        # messages added with addMessage are counted on the way, otherwise all messages are counted again
+        if self.countedMessages < 0 or self.countedMessages > len(self.messages):
+            self.typeCounts = {}
+            self.countedMessages = 0
+        if self.countedMessages < len(self.messages):
+            typeCounts = self.typeCounts
+            for i in range(self.countedMessages, len(self.messages)):
+                messageType = self.messages[i].getMessageType()
+                typeCounts[messageType] = typeCounts.get(messageType, 0) + 1
+            self.countedMessages = len(self.messages)
+        return self.typeCounts
+
 
 class Command(SMCApi.ICommand):
     def __init__(self, actions, typev=None):
@@ -104,6 +162,252 @@ class Command(SMCApi.ICommand):
         return self.typev
 
 
+def objectTypeOf(value):
+    # type: (any) -> SMCApi.ObjectType
+    valueType = type(value)
+    if valueType is str or valueType is unicode:
+        return SMCApi.ObjectType.STRING
+    elif valueType == bool:
+        return SMCApi.ObjectType.BOOLEAN
+    elif valueType == int:
+        return SMCApi.ObjectType.INTEGER
+    elif valueType == long:
+        return SMCApi.ObjectType.LONG
+    elif valueType == float:
+        return SMCApi.ObjectType.DOUBLE
+    elif valueType == bytearray or valueType == bytes:
+        return SMCApi.ObjectType.BYTES
+    elif valueType == SMCApi.ObjectArray:
+        return SMCApi.ObjectType.OBJECT_ARRAY
+    elif valueType == SMCApi.ObjectElement:
+        return SMCApi.ObjectType.OBJECT_ELEMENT
+    return SMCApi.ObjectType.VALUE_ANY
+
+
+class ObjectArrayBuilder(object):
+    # numeric fields are kept in typed arrays, everything else in plain lists
+    typeCodes = {
+        SMCApi.ObjectType.BYTE: "b",
+        SMCApi.ObjectType.SHORT: "h",
+        SMCApi.ObjectType.INTEGER: "i",
+        SMCApi.ObjectType.LONG: "l",
+        SMCApi.ObjectType.FLOAT: "f",
+        SMCApi.ObjectType.DOUBLE: "d",
+    }
+
+    def __init__(self, fields, rows=None):
+        # type: (List[object], List[object]) -> None
+        if not fields:
+            raise SMCApi.ModuleException("fields")
+        self.fields = []
+        self.types = []
+        self.columns = []
+        self.fieldIndex = {}
+        for field in fields:
+            if isinstance(field, tuple):
+                name, typev = field
+            else:
+                name, typev = field, None
+            if name in self.fieldIndex:
+                raise SMCApi.ModuleException("fields")
+            self.fieldIndex[name] = len(self.fields)
+            self.fields.append(name)
+            self.types.append(typev)
+            typeCode = self.typeCodes.get(typev)
+            self.columns.append(array.array(typeCode) if typeCode else [])
+        self.count = 0
+        # type: Dict[int, Dict[object, List[int]]]
+        self.indexes = {}
+        if rows:
+            self.extend(rows)
+
+    @classmethod
+    def fromObjectArray(cls, objectArray, fields=None):
+        # type: (SMCApi.ObjectArray, List[object]) -> ObjectArrayBuilder
+        if fields is None:
+            fields = []
+            if objectArray.size() > 0:
+                fields = [f.getName() for f in objectArray.get(0).getFields()]
+        builder = cls(fields)
+        rows = []
+        for i in range(objectArray.size()):
+            rows.append(dict((f.getName(), f.getValue()) for f in objectArray.get(i).getFields()))
+        builder.extend(rows)
+        return builder
+
+    def size(self):
+        return self.count
+
+    def getFields(self):
+        return self.fields
+
+    def getFieldId(self, name):
+        if name not in self.fieldIndex:
+            raise SMCApi.ModuleException("name")
+        return self.fieldIndex[name]
+
+    def getColumn(self, name):
+        return self.columns[self.getFieldId(name)]
+
+    def getValue(self, id, name):
+        if id < 0 or id >= self.count:
+            raise SMCApi.ModuleException("id")
+        return self.columns[self.getFieldId(name)][id]
+
+    def getRow(self, id):
+        if id < 0 or id >= self.count:
+            raise SMCApi.ModuleException("id")
+        return tuple(column[id] for column in self.columns)
+
+    def append(self, row):
+        # type: (object) -> None
+        if isinstance(row, dict):
+            row = [row.get(name) for name in self.fields]
+        elif len(row) != len(self.fields):
+            raise SMCApi.ModuleException("row")
+        # convert the whole row first, a rejected value must not leave the columns with different lengths
+        row = self.convert(row, "row")
+        for column, value in zip(self.columns, row):
+            column.append(value)
+        for fieldId, index in self.indexes.iteritems():
+            index.setdefault(row[fieldId], []).append(self.count)
+        self.count += 1
+
+    def extend(self, rows):
+        # type: (List[object]) -> None
+        # dict and sequence rows can be mixed, every row is checked on its own
+        rows = [[row.get(name) for name in self.fields] if isinstance(row, dict) else row for row in rows]
+        if not rows:
+            return
+        if any(len(row) != len(self.fields) for row in rows):
+            raise SMCApi.ModuleException("rows")
+        values = zip(*rows)
+        values = [self.convert(columnValues, "rows", column) for column, columnValues in zip(self.columns, values)]
+        for column, columnValues in zip(self.columns, values):
+            column.extend(columnValues)
+        for fieldId, index in self.indexes.iteritems():
+            for position, value in enumerate(values[fieldId], self.count):
+                index.setdefault(value, []).append(position)
+        self.count += len(rows)
+
+    def convert(self, values, name, column=None):
+        # type: (List[object], str, object) -> List[object]
+        # with a column converts values of that column, otherwise one value per column
+        try:
+            if column is not None:
+                if isinstance(column, array.array):
+                    return array.array(column.typecode, values)
+                return list(values)
+            return [array.array(column.typecode, [value])[0] if isinstance(column, array.array) else value
+                    for column, value in zip(self.columns, values)]
+        except (TypeError, OverflowError):
+            raise SMCApi.ModuleException(name)
+
+    def find(self, name, value):
+        # type: (str, object) -> List[int]
+        fieldId = self.getFieldId(name)
+        index = self.indexes.get(fieldId)
+        if index is None:
+            index = {}
+            for position, columnValue in enumerate(self.columns[fieldId]):
+                index.setdefault(columnValue, []).append(position)
+            self.indexes[fieldId] = index
+        return index.get(value, [])
+
+    def build(self):
+        # type: () -> SMCApi.ObjectArray
+        objects = []
+        for id in range(self.count):
+            objectFields = []
+            for name, typev, column in zip(self.fields, self.types, self.columns):
+                value = column[id]
+                objectFields.append(SMCApi.ObjectField(name, value, typev if typev is not None else objectTypeOf(value)))
+            objects.append(SMCApi.ObjectElement(objectFields))
+        return SMCApi.ObjectArray(objects, SMCApi.ObjectType.OBJECT_ELEMENT)
+
+
+class ObjectPathQuery(object):
+    # path segments are separated by '.', array elements are addressed as [n] or [*]
+    pathSegmentPattern = None
+
+    def __init__(self, paths):
+        # type: (List[str]) -> None
+        if not paths:
+            raise SMCApi.ModuleException("paths")
+        self.paths = list(paths)
+        self.compiledPaths = [ObjectPathQuery.compile(path) for path in self.paths]
+
+    @staticmethod
+    def compile(path):
+        # type: (str) -> List[tuple]
+        if ObjectPathQuery.pathSegmentPattern is None:
+            import re
+            ObjectPathQuery.pathSegmentPattern = re.compile(r"\[(\*|-?\d+)\]|([^.\[\]]+)")
+        segments = []
+        for position, name in ObjectPathQuery.pathSegmentPattern.findall(path):
+            if name:
+                segments.append((False, name))
+            elif position == "*":
+                segments.append((True, None))
+            else:
+                segments.append((True, int(position)))
+        if not segments:
+            raise SMCApi.ModuleException("path")
+        return segments
+
+    def getPaths(self):
+        return self.paths
+
+    def select(self, value):
+        # type: (object) -> List[object]
+        result = []
+        for segments in self.compiledPaths:
+            if isinstance(value, ObjectArrayBuilder):
+                result.extend(self.selectColumns(value, segments))
+            else:
+                result.extend(self.walk([value], segments))
+        return result
+
+    def selectColumns(self, builder, segments):
+        # type: (ObjectArrayBuilder, List[tuple]) -> List[object]
+        position = None
+        if segments[0][0]:
+            position = segments[0][1]
+            segments = segments[1:]
+        if not segments or segments[0][0] or segments[0][1] not in builder.fieldIndex:
+            return self.walk([builder.build()], ([(True, position)] if position is not None else []) + segments)
+        column = builder.columns[builder.fieldIndex[segments[0][1]]]
+        if position is None:
+            values = list(column)
+        elif -builder.size() <= position < builder.size():
+            values = [column[position]]
+        else:
+            values = []
+        return self.walk(values, segments[1:])
+
+    @staticmethod
+    def walk(values, segments):
+        # type: (List[object], List[tuple]) -> List[object]
+        for isPosition, key in segments:
+            found = []
+            for value in values:
+                if isinstance(value, SMCApi.ObjectArray):
+                    size = value.size()
+                    if not isPosition:
+                        found.extend(ObjectPathQuery.walk([value.get(i) for i in range(size)], [(isPosition, key)]))
+                    elif key is None:
+                        found.extend(value.get(i) for i in range(size))
+                    elif -size <= key < size:
+                        found.append(value.get(key if key >= 0 else size + key))
+                elif isinstance(value, SMCApi.ObjectElement) and not isPosition:
+                    for field in value.getFields():
+                        if field.getName() == key:
+                            found.append(field.getValue())
+                            break
+            values = found
+        return values
+
+
 class ModuleType(object):
     def __init__(self, name, minCountSources=0, maxCountSources=-1, minCountExecutionContexts=0, maxCountExecutionContexts=-1,
                  minCountManagedConfigurations=0, maxCountManagedConfigurations=-1):
@@ -157,7 +461,144 @@ class Module(SMCApi.CFGIModule):
         return SMCApi.ObjectElement()
 
 
+# the default module listed by every execution context tool, created once
+defaultModule = Module("Module")
+
+
+class RemovedKey(object):
+    # marks a key removed from a CopyOnWriteDict, the class itself survives copy and pickle unchanged
+    pass
+
+
+class CopyOnWriteDict(collections.MutableMapping):
+    # read only base shared between copies plus a per copy layer of overridden and removed keys
+    removed = RemovedKey
+
+    def __init__(self, values=None):
+        # type: (Dict[str, object]) -> None
+        if isinstance(values, CopyOnWriteDict):
+            self.base = values.base
+            self.overrides = dict(values.overrides)
+            self.size = values.size
+        else:
+            self.base = dict(values) if values else {}
+            self.overrides = {}
+            self.size = len(self.base)
+
+    def __getitem__(self, key):
+        value = self.overrides.get(key, self)
+        if value is self:
+            return self.base[key]
+        if value is CopyOnWriteDict.removed:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        value = self.overrides.get(key, self)
+        if value is self:
+            return self.base.get(key, default)
+        if value is CopyOnWriteDict.removed:
+            return default
+        return value
+
+    def __contains__(self, key):
+        value = self.overrides.get(key, self)
+        if value is self:
+            return key in self.base
+        return value is not CopyOnWriteDict.removed
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            self.size += 1
+        self.overrides[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        if key in self.base:
+            self.overrides[key] = CopyOnWriteDict.removed
+        else:
+            del self.overrides[key]
+        self.size -= 1
+
+    def __iter__(self):
+        for key in self.base:
+            if key not in self.overrides:
+                yield key
+        for key, value in self.overrides.iteritems():
+            if value is not CopyOnWriteDict.removed:
+                yield key
+
+    def __len__(self):
+        return self.size
+
+    def __repr__(self):
+        return "CopyOnWriteDict({!r})".format(dict(self.iteritems()))
+
+    def __deepcopy__(self, memo):
+        import copy
+        result = CopyOnWriteDict(self)
+        result.overrides = copy.deepcopy(self.overrides, memo)
+        return result
+
+    def copy(self):
+        return CopyOnWriteDict(self)
+
+    def countOverrides(self):
+        return len(self.overrides)
+
+
+def internName(name):
+    # type: (str) -> str
+    # names of control messages repeat constantly, equal names share one string
+    if type(name) is str:
+        return intern(name)
+    return name
+
+
+class ToolReference(weakref.ref):
+    # weak reference that deep copies and pickles its referent, so copies of a graph point to the copied tool
+    def __deepcopy__(self, memo):
+        import copy
+        referent = self()
+        if referent is None:
+            return None
+        return ToolReference(copy.deepcopy(referent, memo))
+
+    def __reduce__(self):
+        return ToolReference, (self(),)
+
+
+class WeakAttribute(object):
+    # attribute kept as a weak reference, reads None after the referent is collected
+    def __init__(self, name):
+        # type: (str) -> None
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        reference = instance.__dict__.get(self.name)
+        if reference is None:
+            return None
+        return reference()
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.name] = ToolReference(value) if value is not None else None
+
+
+def addControlMessage(owner, messageType, value):
+    # type: (object, SMCApi.MessageType, object) -> None
+    # every control message of a graph object goes through here, the message of a collected tool has no reader and is dropped
+    executionContextTool = owner.executionContextTool
+    if executionContextTool is not None:
+        executionContextTool.add(messageType, value)
+
+
 class Container(SMCApi.CFGIContainerManaged):
+    # the tool is referenced weakly, configurations must not keep old tools and their output alive
+    executionContextTool = WeakAttribute("executionContextToolReference")
+
     def __init__(self, executionContextTool, name, containers=None, configurations=None):
         # type: (ExecutionContextToolImpl, str, List[SMCApi.CFGIContainer], List[SMCApi.CFGIConfiguration]) -> None
         self.executionContextTool = executionContextTool
@@ -197,7 +638,7 @@ class Container(SMCApi.CFGIContainerManaged):
     def createContainer(self, name):
         container = Container(self.executionContextTool, name)
         self.containers.append(container)
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_CONTAINER_CREATE, container.getName())
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_CONTAINER_CREATE, container.getName())
         return container
 
     def removeContainer(self, id):
@@ -209,7 +650,7 @@ class Container(SMCApi.CFGIContainerManaged):
         if container.countContainers() > 0:
             raise SMCApi.ModuleException("container has child containers")
         self.containers.pop(id)
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_CONTAINER_REMOVE, container.getName())
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_CONTAINER_REMOVE, container.getName())
 
     def getName(self):
         return self.name
@@ -237,6 +678,8 @@ class Container(SMCApi.CFGIContainerManaged):
 
 
 class Configuration(SMCApi.CFGIConfigurationManaged):
+    executionContextTool = WeakAttribute("executionContextToolReference")
+
     def __init__(self, executionContextTool, container, module, name, description=None, settings=None, variables=None, executionContexts=None,
                  bufferSize=0, threadBufferSize=1):
         # type: (ExecutionContextToolImpl, Container, SMCApi.Module, str, str, Dict[str, SMCApi.IValue], Dict[str, SMCApi.IValue], List[SMCApi.CFGIExecutionContextManaged], int, int) -> None
@@ -245,14 +688,9 @@ class Configuration(SMCApi.CFGIConfigurationManaged):
         self.module = module
         self.name = name
         self.description = description
-        if settings:
-            self.settings = dict(settings)
-        else:
-            self.settings = {}
-        if variables:
-            self.variables = dict(variables)
-        else:
-            self.variables = {}
+        # copies of a CopyOnWriteDict share its storage until a key is changed
+        self.settings = CopyOnWriteDict(settings)
+        self.variables = CopyOnWriteDict(variables)
         if executionContexts:
             self.executionContexts = list(executionContexts)
         else:
@@ -260,6 +698,9 @@ class Configuration(SMCApi.CFGIConfigurationManaged):
         self.bufferSize = bufferSize
         self.threadBufferSize = threadBufferSize
         self.enable = True
+        # control message names "<configuration> <key or execution context>", cleared on rename
+        # type: Dict[str, str]
+        self.memberNames = {}
 
         if self.container:
             self.container.configurations.append(self)
@@ -280,36 +721,44 @@ class Configuration(SMCApi.CFGIConfigurationManaged):
 
     def setName(self, name):
         self.name = name
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_CONFIGURATION_UPDATE, self.getName())
+        self.memberNames = {}
+        for ec in self.executionContexts:
+            ec.setConfigurationName(name)
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_CONFIGURATION_UPDATE, self.getName())
+
+    def getMemberName(self, member):
+        # type: (str) -> str
+        name = self.memberNames.get(member)
+        if name is None:
+            name = self.memberNames[member] = internName("{} {}".format(self.getName(), member))
+        return name
 
     def setSetting(self, key, value):
         self.settings[key] = Value(value)
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_CONFIGURATION_SETTING_UPDATE,
-                                      "{} {}".format(self.getName(), key))
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_CONFIGURATION_SETTING_UPDATE,
+                          self.getMemberName(key))
 
     def setVariable(self, key, value):
         self.variables[key] = Value(value)
-        if self.executionContextTool is not None:
-            self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_CONFIGURATION_VARIABLE_UPDATE,
-                                          "{} {}".format(self.getName(), key))
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_CONFIGURATION_VARIABLE_UPDATE,
+                          self.getMemberName(key))
 
     def removeVariable(self, key):
         del self.variables[key]
-        if self.executionContextTool is not None:
-            self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_CONFIGURATION_VARIABLE_REMOVE,
-                                          "{} {}".format(self.getName(), key))
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_CONFIGURATION_VARIABLE_REMOVE,
+                          self.getMemberName(key))
 
     def setBufferSize(self, bufferSize):
         self.bufferSize = bufferSize
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_CONFIGURATION_UPDATE, self.getName())
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_CONFIGURATION_UPDATE, self.getName())
 
     def setThreadBufferSize(self, threadBufferSize):
         self.threadBufferSize = threadBufferSize
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_CONFIGURATION_UPDATE, self.getName())
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_CONFIGURATION_UPDATE, self.getName())
 
     def setEnable(self, enable):
         self.enable = enable
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_CONFIGURATION_UPDATE, self.getName())
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_CONFIGURATION_UPDATE, self.getName())
 
     def countExecutionContexts(self):
         return len(self.executionContexts)
@@ -320,9 +769,9 @@ class Configuration(SMCApi.CFGIConfigurationManaged):
         return self.executionContexts[id]
 
     def createExecutionContext(self, name, type, maxWorkInterval=-1):
-        executionContext = ExecutionContext(self.executionContextTool, name, None, None, None, None, maxWorkInterval, type)
+        executionContext = ExecutionContext(self.executionContextTool, name, self, None, None, None, maxWorkInterval, type)
         self.executionContexts.append(executionContext)
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_EXECUTION_CONTEXT_CREATE, "{} {}".format(self.getName(), name))
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_EXECUTION_CONTEXT_CREATE, self.getMemberName(name))
         return executionContext
 
     def updateExecutionContext(self, id, type, name, maxWorkInterval=-1):
@@ -330,7 +779,7 @@ class Configuration(SMCApi.CFGIConfigurationManaged):
         executionContext.setName(name)
         executionContext.setType(type)
         executionContext.setMaxWorkInterval(maxWorkInterval)
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_EXECUTION_CONTEXT_UPDATE, "{} {}".format(self.getName(), name))
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_EXECUTION_CONTEXT_UPDATE, self.getMemberName(name))
         return executionContext
 
     def removeExecutionContext(self, id):
@@ -338,8 +787,8 @@ class Configuration(SMCApi.CFGIConfigurationManaged):
             raise SMCApi.ModuleException("id")
         executionContext = self.executionContexts[id]
         del self.executionContexts[id]
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_EXECUTION_CONTEXT_REMOVE,
-                                      "{} {}".format(self.getName(), executionContext.getName()))
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_EXECUTION_CONTEXT_REMOVE,
+                          self.getMemberName(executionContext.getName()))
 
     def getContainer(self):
         return self.container
@@ -359,9 +808,7 @@ class Configuration(SMCApi.CFGIConfigurationManaged):
     def getSetting(self, key):
         if not key:
             raise SMCApi.ModuleException("key")
-        if key in self.settings:
-            return self.settings[key]
-        return None
+        return self.settings.get(key)
 
     def getAllVariables(self):
         return self.variables
@@ -369,9 +816,7 @@ class Configuration(SMCApi.CFGIConfigurationManaged):
     def getVariable(self, key):
         if not key:
             raise SMCApi.ModuleException("key")
-        if key in self.variables:
-            return self.variables[key]
-        return None
+        return self.variables.get(key)
 
     def getBufferSize(self):
         return self.bufferSize
@@ -396,6 +841,8 @@ class Configuration(SMCApi.CFGIConfigurationManaged):
 
 
 class SourceList(SMCApi.CFGISourceListManaged):
+    executionContextTool = WeakAttribute("executionContextToolReference")
+
     def __init__(self, executionContextTool, configurationName, executionContextName, sources=None):
         # type: (ExecutionContextToolImpl, str, str, List[SMCApi.CFGISourceManaged]) -> None
         self.executionContextTool = executionContextTool
@@ -405,9 +852,38 @@ class SourceList(SMCApi.CFGISourceListManaged):
             self.sources = list(sources)
         else:
             self.sources = []
+        # control message names "<configuration>.<execution context>.<order>", cleared on rename
+        # type: Dict[int, str]
+        self.sourceNames = {}
+
+    def setExecutionContextTool(self, executionContextTool):
+        # type: (ExecutionContextToolImpl) -> None
+        self.executionContextTool = executionContextTool
+        for source in self.sources:
+            source.setExecutionContextTool(executionContextTool)
 
     def setConfigurationName(self, configurationName):
+        if configurationName == self.configurationName:
+            return
         self.configurationName = configurationName
+        self.sourceNames = {}
+        for source in self.sources:
+            source.rename(self.configurationName, self.executionContextName)
+
+    def setExecutionContextName(self, executionContextName):
+        if executionContextName == self.executionContextName:
+            return
+        self.executionContextName = executionContextName
+        self.sourceNames = {}
+        for source in self.sources:
+            source.rename(self.configurationName, self.executionContextName)
+
+    def getSourceName(self, order):
+        # type: (int) -> str
+        name = self.sourceNames.get(order)
+        if name is None:
+            name = self.sourceNames[order] = internName("{}.{}.{}".format(self.configurationName, self.executionContextName, order))
+        return name
 
     def countSource(self):
         return len(self.sources)
@@ -417,74 +893,74 @@ class SourceList(SMCApi.CFGISourceListManaged):
 
     def createSourceConfiguration(self, configuration, getType=SMCApi.SourceGetType.NEW, countLast=1, eventDriven=False):
         source = Source(self.executionContextTool, self.configurationName, self.executionContextName, None, configuration, None, eventDriven, None,
-                        SMCApi.SourceType.MODULE_CONFIGURATION, self.countSource())
+                        SMCApi.SourceType.MODULE_CONFIGURATION, self.countSource(), None, getType, countLast)
         self.sources.append(source)
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_SOURCE_CONTEXT_CREATE,
-                                      "{}.{}.{}".format(self.configurationName, self.executionContextName, source.getOrder()))
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_SOURCE_CONTEXT_CREATE,
+                          self.getSourceName(source.getOrder()))
         return source
 
     def createSourceExecutionContext(self, executionContext, getType=SMCApi.SourceGetType.NEW, countLast=1, eventDriven=False):
         source = Source(self.executionContextTool, self.configurationName, self.executionContextName, executionContext, None, None, eventDriven, None,
-                        SMCApi.SourceType.MODULE_CONFIGURATION, self.countSource())
+                        SMCApi.SourceType.EXECUTION_CONTEXT, self.countSource(), None, getType, countLast)
         self.sources.append(source)
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_SOURCE_CONTEXT_CREATE,
-                                      "{}.{}.{}".format(self.configurationName, self.executionContextName, source.getOrder()))
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_SOURCE_CONTEXT_CREATE,
+                          self.getSourceName(source.getOrder()))
         return source
 
     def createSourceValue(self, value):
         source = Source(self.executionContextTool, self.configurationName, self.executionContextName, None, None, Value(value), False, None,
                         SMCApi.SourceType.STATIC_VALUE, self.countSource())
         self.sources.append(source)
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_SOURCE_CONTEXT_CREATE,
-                                      "{}.{}.{}".format(self.configurationName, self.executionContextName, source.getOrder()))
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_SOURCE_CONTEXT_CREATE,
+                          self.getSourceName(source.getOrder()))
         return source
 
     def createSource(self):
         source = Source(self.executionContextTool, self.configurationName, self.executionContextName, None, None, None, False, None,
                         SMCApi.SourceType.MULTIPART, self.countSource())
         self.sources.append(source)
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_SOURCE_CONTEXT_CREATE,
-                                      "{}.{}.{}".format(self.configurationName, self.executionContextName, source.getOrder()))
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_SOURCE_CONTEXT_CREATE,
+                          self.getSourceName(source.getOrder()))
         return source
 
     def createSourceObjectArray(self, value, fields):
         source = Source(self.executionContextTool, self.configurationName, self.executionContextName, None, None, Value(value), False, None,
-                        SMCApi.SourceType.OBJECT_ARRAY, self.countSource())
+                        SMCApi.SourceType.OBJECT_ARRAY, self.countSource(), fields)
         self.sources.append(source)
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_SOURCE_CONTEXT_CREATE,
-                                      "{}.{}.{}".format(self.configurationName, self.executionContextName, source.getOrder()))
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_SOURCE_CONTEXT_CREATE,
+                          self.getSourceName(source.getOrder()))
         return source
 
     def updateSourceConfiguration(self, id, configuration, getType=SMCApi.SourceGetType.NEW, countLast=1, eventDriven=False):
         source = Source(self.executionContextTool, self.configurationName, self.executionContextName, None, configuration, None, eventDriven, None,
-                        SMCApi.SourceType.MODULE_CONFIGURATION, self.countSource())
+                        SMCApi.SourceType.MODULE_CONFIGURATION, self.countSource(), None, getType, countLast)
         self.sources[id] = source
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_SOURCE_CONTEXT_UPDATE,
-                                      "{}.{}.{}".format(self.configurationName, self.executionContextName, source.getOrder()))
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_SOURCE_CONTEXT_UPDATE,
+                          self.getSourceName(source.getOrder()))
         return source
 
     def updateSourceExecutionContext(self, id, executionContext, getType=SMCApi.SourceGetType.NEW, countLast=1, eventDriven=False):
         source = Source(self.executionContextTool, self.configurationName, self.executionContextName, executionContext, None, None, eventDriven, None,
-                        SMCApi.SourceType.MODULE_CONFIGURATION, self.countSource())
+                        SMCApi.SourceType.EXECUTION_CONTEXT, self.countSource(), None, getType, countLast)
         self.sources[id] = source
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_SOURCE_CONTEXT_UPDATE,
-                                      "{}.{}.{}".format(self.configurationName, self.executionContextName, source.getOrder()))
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_SOURCE_CONTEXT_UPDATE,
+                          self.getSourceName(source.getOrder()))
         return source
 
     def updateSourceValue(self, id, value):
         source = Source(self.executionContextTool, self.configurationName, self.executionContextName, None, None, Value(value), False, None,
                         SMCApi.SourceType.STATIC_VALUE, self.countSource())
         self.sources[id] = source
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_SOURCE_CONTEXT_UPDATE,
-                                      "{}.{}.{}".format(self.configurationName, self.executionContextName, source.getOrder()))
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_SOURCE_CONTEXT_UPDATE,
+                          self.getSourceName(source.getOrder()))
         return source
 
     def updateSourceObjectArray(self, id, value, fields):
         source = Source(self.executionContextTool, self.configurationName, self.executionContextName, None, None, Value(value), False, None,
-                        SMCApi.SourceType.OBJECT_ARRAY, self.countSource())
+                        SMCApi.SourceType.OBJECT_ARRAY, self.countSource(), fields)
         self.sources[id] = source
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_SOURCE_CONTEXT_UPDATE,
-                                      "{}.{}.{}".format(self.configurationName, self.executionContextName, source.getOrder()))
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_SOURCE_CONTEXT_UPDATE,
+                          self.getSourceName(source.getOrder()))
         return source
 
     def removeSource(self, id):
@@ -492,8 +968,8 @@ class SourceList(SMCApi.CFGISourceListManaged):
             raise SMCApi.ModuleException("id")
         source = self.sources[id]
         del self.sources[id]
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_SOURCE_CONTEXT_UPDATE,
-                                      "{}.{}.{}".format(self.configurationName, self.executionContextName, source.getOrder()))
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_SOURCE_CONTEXT_UPDATE,
+                          self.getSourceName(source.getOrder()))
 
     def getSourceListManaged(self, id):
         source = self.sources[id]
@@ -531,26 +1007,37 @@ class ExecutionContext(SourceList, SMCApi.CFGIExecutionContextManaged):
         self.maxWorkInterval = maxWorkInterval
         self.type = type
         self.enable = True
-
-    def setExecutionContextTool(self, executionContextTool):
-        self.executionContextTool = executionContextTool
+        self.qualifiedName = None
 
     def setConfiguration(self, configuration):
         self.configuration = configuration
         self.setConfigurationName(configuration.getName())
 
+    def setConfigurationName(self, configurationName):
+        if configurationName != self.configurationName:
+            self.qualifiedName = None
+        super(ExecutionContext, self).setConfigurationName(configurationName)
+
     def setName(self, name):
         self.name = name
+        self.qualifiedName = None
+        self.setExecutionContextName(name)
+
+    def getQualifiedName(self):
+        # type: () -> str
+        if self.qualifiedName is None:
+            self.qualifiedName = internName("{}.{}".format(self.configurationName, self.getName()))
+        return self.qualifiedName
 
     def setMaxWorkInterval(self, maxWorkInterval):
         self.maxWorkInterval = maxWorkInterval
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_EXECUTION_CONTEXT_UPDATE,
-                                      "{}.{}".format(self.configuration.getName(), self.getName()))
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_EXECUTION_CONTEXT_UPDATE,
+                          self.getQualifiedName())
 
     def setEnable(self, enable):
         self.enable = enable
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_EXECUTION_CONTEXT_UPDATE,
-                                      "{}.{}".format(self.configuration.getName(), self.getName()))
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_EXECUTION_CONTEXT_UPDATE,
+                          self.getQualifiedName())
 
     def countExecutionContexts(self):
         return len(self.executionContexts)
@@ -564,22 +1051,22 @@ class ExecutionContext(SourceList, SMCApi.CFGIExecutionContextManaged):
         if id < 0 or id >= self.countExecutionContexts():
             raise SMCApi.ModuleException("id")
         self.executionContexts.insert(id, executionContext)
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_EXECUTION_CONTEXT_UPDATE,
-                                      "{}.{}".format(self.configuration.getName(), self.getName()))
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_EXECUTION_CONTEXT_UPDATE,
+                          self.getQualifiedName())
 
     def updateExecutionContext(self, id, executionContext):
         if id < 0 or id >= self.countExecutionContexts():
             raise SMCApi.ModuleException("id")
         self.executionContexts[id] = executionContext
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_EXECUTION_CONTEXT_UPDATE,
-                                      "{}.{}".format(self.configuration.getName(), self.getName()))
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_EXECUTION_CONTEXT_UPDATE,
+                          self.getQualifiedName())
 
     def removeExecutionContext(self, id):
         if id < 0 or id >= self.countExecutionContexts():
             raise SMCApi.ModuleException("id")
         del self.executionContexts[id]
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_EXECUTION_CONTEXT_UPDATE,
-                                      "{}.{}".format(self.configuration.getName(), self.getName()))
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_EXECUTION_CONTEXT_UPDATE,
+                          self.getQualifiedName())
 
     def countManagedConfigurations(self):
         return len(self.managedConfigurations)
@@ -593,22 +1080,22 @@ class ExecutionContext(SourceList, SMCApi.CFGIExecutionContextManaged):
         if id < 0 or id >= self.countManagedConfigurations():
             raise SMCApi.ModuleException("id")
         self.managedConfigurations.insert(id, configuration)
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_EXECUTION_CONTEXT_UPDATE,
-                                      "{}.{}".format(self.configuration.getName(), self.getName()))
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_EXECUTION_CONTEXT_UPDATE,
+                          self.getQualifiedName())
 
     def updateManagedConfiguration(self, id, configuration):
         if id < 0 or id >= self.countManagedConfigurations():
             raise SMCApi.ModuleException("id")
         self.managedConfigurations[id] = configuration
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_EXECUTION_CONTEXT_UPDATE,
-                                      "{}.{}".format(self.configuration.getName(), self.getName()))
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_EXECUTION_CONTEXT_UPDATE,
+                          self.getQualifiedName())
 
     def removeManagedConfiguration(self, id):
         if id < 0 or id >= self.countManagedConfigurations():
             raise SMCApi.ModuleException("id")
         del self.managedConfigurations[id]
-        self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_EXECUTION_CONTEXT_UPDATE,
-                                      "{}.{}".format(self.configuration.getName(), self.getName()))
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_EXECUTION_CONTEXT_UPDATE,
+                          self.getQualifiedName())
 
     def setType(self, type):
         self.type = type
@@ -636,10 +1123,14 @@ class SourceFilter(SMCApi.CFGISourceFilter):
     def __init__(self, type, params=None):
         # type: (SMCApi.SourceFilterType, List) -> None
         self.type = type
-        if self.params:
+        if params:
             self.params = list(params)
         else:
             self.params = []
+        if self.type == SMCApi.SourceFilterType.OBJECT_PATHS and self.params:
+            self.query = ObjectPathQuery(self.params[0])
+        else:
+            self.query = None
 
     def getType(self):
         return self.type
@@ -647,6 +1138,15 @@ class SourceFilter(SMCApi.CFGISourceFilter):
     def getParams(self):
         return self.params
 
+    def getQuery(self):
+        return self.query
+
+    def select(self, value):
+        # type: (object) -> List[object]
+        if self.query is None:
+            raise SMCApi.ModuleException("type")
+        return self.query.select(value)
+
     def countParams(self):
         if self.type == SMCApi.SourceFilterType.POSITION:
             return 4
@@ -666,10 +1166,16 @@ class SourceFilter(SMCApi.CFGISourceFilter):
 
 
 class Source(SMCApi.CFGISourceManaged):
+    executionContextTool = WeakAttribute("executionContextToolReference")
+
     def __init__(self, executionContextTool, configurationName, executionContextName, executionContextSource=None, configurationSource=None,
                  valueSource=None,
-                 eventDriven=False, sources=None, type=SMCApi.SourceType.STATIC_VALUE, order=0):
-        # type: (ExecutionContextToolImpl, str,str, SMCApi.CFGIExecutionContext, SMCApi.CFGIConfiguration, SMCApi.IValue, bool, List[SMCApi.CFGISourceManaged], SMCApi.SourceType, int) -> None
+                 eventDriven=False, sources=None, type=SMCApi.SourceType.STATIC_VALUE, order=0, fields=None, getType=SMCApi.SourceGetType.NEW,
+                 countLast=1):
+        # type: (ExecutionContextToolImpl, str,str, SMCApi.CFGIExecutionContext, SMCApi.CFGIConfiguration, SMCApi.IValue, bool, List[SMCApi.CFGISourceManaged], SMCApi.SourceType, int, List[str], SMCApi.SourceGetType, int) -> None
+        # countLast is used only by LAST sources
+        if getType == SMCApi.SourceGetType.LAST and countLast < 1:
+            raise SMCApi.ModuleException("countLast")
         self.executionContextTool = executionContextTool
         self.configurationName = configurationName
         self.executionContextName = executionContextName
@@ -681,11 +1187,41 @@ class Source(SMCApi.CFGISourceManaged):
         self.valueSource = valueSource
         self.type = type
         self.order = order
+        self.getTypev = getType
+        self.countLast = countLast
         if SMCApi.SourceType.MULTIPART == type:
             self.sourceList = SourceList(self.executionContextTool, self.configurationName, self.executionContextName, sources)
         else:
             self.sourceList = None
+        if fields:
+            self.fields = list(fields)
+            self.fieldsQuery = ObjectPathQuery(self.fields)
+        else:
+            self.fields = []
+            self.fieldsQuery = None
         self.filters = []
+        self.qualifiedName = None
+
+    def setExecutionContextTool(self, executionContextTool):
+        # type: (ExecutionContextToolImpl) -> None
+        self.executionContextTool = executionContextTool
+        if self.sourceList is not None:
+            self.sourceList.setExecutionContextTool(executionContextTool)
+
+    def rename(self, configurationName, executionContextName):
+        # type: (str, str) -> None
+        self.configurationName = configurationName
+        self.executionContextName = executionContextName
+        self.qualifiedName = None
+        if self.sourceList is not None:
+            self.sourceList.setConfigurationName(configurationName)
+            self.sourceList.setExecutionContextName(executionContextName)
+
+    def getQualifiedName(self):
+        # type: () -> str
+        if self.qualifiedName is None:
+            self.qualifiedName = internName("{}.{}.{}".format(self.configurationName, self.executionContextName, self.getOrder()))
+        return self.qualifiedName
 
     def getType(self):
         return self.type
@@ -711,6 +1247,23 @@ class Source(SMCApi.CFGISourceManaged):
     def getParam(self, id):
         return None
 
+    def getFields(self):
+        return self.fields
+
+    def getGetType(self):
+        return self.getTypev
+
+    def getCountLast(self):
+        return self.countLast
+
+    def selectFields(self):
+        # type: () -> List[object]
+        if self.valueSource is None:
+            return []
+        if self.fieldsQuery is None:
+            return [self.valueSource.getValue()]
+        return self.fieldsQuery.select(self.valueSource.getValue())
+
     def countFilters(self):
         return len(self.filters)
 
@@ -730,7 +1283,11 @@ class Source(SMCApi.CFGISourceManaged):
         return None
 
     def createFilterObjectPaths(self, paths):
-        return None
+        sourceFilter = SourceFilter(SMCApi.SourceFilterType.OBJECT_PATHS, [paths])
+        self.filters.append(sourceFilter)
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_SOURCE_CONTEXT_UPDATE,
+                          self.getQualifiedName())
+        return sourceFilter
 
     def updateFilterPosition(self, id, range, period=0, countPeriods=0, startOffset=0, forObject=False):
         return None
@@ -745,7 +1302,13 @@ class Source(SMCApi.CFGISourceManaged):
         return None
 
     def updateFilterObjectPaths(self, id, paths):
-        return None
+        if id < 0 or id >= self.countFilters():
+            raise SMCApi.ModuleException("id")
+        sourceFilter = SourceFilter(SMCApi.SourceFilterType.OBJECT_PATHS, [paths])
+        self.filters[id] = sourceFilter
+        addControlMessage(self, SMCApi.MessageType.CONFIGURATION_CONTROL_SOURCE_CONTEXT_UPDATE,
+                          self.getQualifiedName())
+        return sourceFilter
 
     def removeFilter(self, id):
         del self.filters[id]
@@ -755,6 +1318,7 @@ class Source(SMCApi.CFGISourceManaged):
 
     def setOrder(self, order):
         self.order = order
+        self.qualifiedName = None
 
 
 class FileToolImpl(SMCApi.FileTool):
@@ -788,6 +1352,9 @@ class FileToolImpl(SMCApi.FileTool):
 
 
 class ConfigurationToolImpl(Configuration, SMCApi.ConfigurationTool):
+    # the tool of the module keeps its execution context tool alive until init replaces it, unlike the weak graph objects
+    executionContextTool = None
+
     def __init__(self, name="default", configuration=None, description=None, settings=None, homeFolder=None, workDirectory=None):
         # type: (str, Configuration, str, Dict[str, SMCApi.IValue], str, str) -> None
 
@@ -817,26 +1384,96 @@ class ConfigurationToolImpl(Configuration, SMCApi.ConfigurationTool):
         super(ConfigurationToolImpl, self).__init__(executionContextTool, container, module, name, description, settings, variables,
                                                     executionContexts, bufferSize, threadBufferSize)
         if homeFolder is None:
-            homeFolder = tempfile.gettempdir()
+            homeFolder = getTempDirectory()
         self.homeFolder = homeFolder
         if workDirectory is None:
-            workDirectory = tempfile.gettempdir()
+            workDirectory = getTempDirectory()
         self.workDirectory = workDirectory
         # type: Dict[str, bool]
         self.variablesChangeFlag = {}
-        for v in self.getAllVariables():
-            self.variablesChangeFlag[v.name] = True
+        for key in self.getAllVariables():
+            self.variablesChangeFlag[key] = True
+        # parsed settings by (key, kind), each entry keeps the Value it was parsed from
+        # type: Dict[tuple, tuple]
+        self.settingsCache = {}
+        # (key, value or RemovedKey) of setVariable and removeVariable calls, None when not recorded
+        # type: List[tuple]
+        self.variableDeltas = None
 
     def init(self, executionContextTool):
         # type: (ExecutionContextToolImpl) -> None
         self.executionContextTool = executionContextTool
 
+    def setSetting(self, key, value):
+        super(ConfigurationToolImpl, self).setSetting(key, value)
+        self.invalidateSetting(key)
+
+    def invalidateSetting(self, key):
+        # type: (str) -> None
+        for cacheKey in [cacheKey for cacheKey in self.settingsCache if cacheKey[0] == key]:
+            del self.settingsCache[cacheKey]
+
+    def clearSettingsCache(self):
+        self.settingsCache.clear()
+
+    def getParsedSetting(self, key, kind, parser, default):
+        # type: (str, tuple, Callable[[object], object], object) -> object
+        value = self.getSetting(key)
+        if value is None:
+            return default
+        cacheKey = (key, kind)
+        cached = self.settingsCache.get(cacheKey)
+        if cached is not None and cached[0] is value:
+            return cached[1]
+        try:
+            parsed = parser(value.getValue())
+        except (TypeError, ValueError) as e:
+            raise SMCApi.ModuleException("setting {}: {}".format(key, e))
+        self.settingsCache[cacheKey] = (value, parsed)
+        return parsed
+
+    def getSettingInt(self, key, default=None):
+        # type: (str, int) -> int
+        return self.getParsedSetting(key, ("int",), int, default)
+
+    def getSettingFloat(self, key, default=None):
+        # type: (str, float) -> float
+        return self.getParsedSetting(key, ("float",), float, default)
+
+    def getSettingBool(self, key, default=None):
+        # type: (str, bool) -> bool
+        def parse(value):
+            if isinstance(value, basestring):
+                if value.strip().lower() in ("true", "1", "yes", "on"):
+                    return True
+                if value.strip().lower() in ("false", "0", "no", "off", ""):
+                    return False
+                raise ValueError("not a boolean: {}".format(value))
+            return bool(value)
+
+        return self.getParsedSetting(key, ("bool",), parse, default)
+
+    def getSettingJson(self, key, default=None):
+        # type: (str, object) -> object
+        # the parsed object is shared between calls and must not be modified
+        import json
+        return self.getParsedSetting(key, ("json",), json.loads, default)
+
+    def getSettingList(self, key, separator=",", default=None):
+        # type: (str, str, List[str]) -> List[str]
+        def parse(value):
+            return [element.strip() for element in value.split(separator) if element.strip()]
+
+        return self.getParsedSetting(key, ("list", separator), parse, default)
+
     def getVariablesChangeFlag(self):
         return self.variablesChangeFlag
 
     def setVariable(self, key, value):
         super(ConfigurationToolImpl, self).setVariable(key, value)
         self.variablesChangeFlag[key] = False
+        if self.variableDeltas is not None:
+            self.variableDeltas.append((key, value))
 
     def isVariableChanged(self, key):
         return self.variablesChangeFlag[key]
@@ -844,6 +1481,8 @@ class ConfigurationToolImpl(Configuration, SMCApi.ConfigurationTool):
     def removeVariable(self, key):
         super(ConfigurationToolImpl, self).removeVariable(key)
         self.variablesChangeFlag[key] = False
+        if self.variableDeltas is not None:
+            self.variableDeltas.append((key, RemovedKey))
 
     def getHomeFolder(self):
         return FileToolImpl(self.homeFolder)
@@ -881,17 +1520,225 @@ class ConfigurationToolImpl(Configuration, SMCApi.ConfigurationTool):
         return self.getShape()
 
 
+def getMemoryReport(roots=None):
+    # type: (List[object]) -> Dict[str, dict]
+    # sizes by type of the roots (default all emulator objects): "size" of the instances and "retained" size including
+    # the objects reachable through them, other roots are not followed and a shared object is counted for the first owner found
+    import gc
+    import types
+    if roots is None:
+        roots = [o for o in gc.get_objects() if type(o).__module__ == __name__ and not isinstance(o, type)]
+    skipTypes = (type, types.ClassType, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.CodeType, types.FrameType,
+                 weakref.ref)
+    seen = set(id(o) for o in roots)
+    report = {}
+    for root in roots:
+        entry = report.setdefault(type(root).__name__, {"count": 0, "size": 0, "retained": 0})
+        size = sys.getsizeof(root)
+        entry["count"] += 1
+        entry["size"] += size
+        retained = size
+        stack = gc.get_referents(root)
+        while stack:
+            obj = stack.pop()
+            if id(obj) in seen or isinstance(obj, skipTypes):
+                continue
+            seen.add(id(obj))
+            retained += sys.getsizeof(obj)
+            stack.extend(gc.get_referents(obj))
+        entry["retained"] += retained
+    return report
+
+
+class StoredActions(object):
+    # read only view of the actions of one source of a FileInputStore
+    def __init__(self, store, sourceId):
+        # type: (FileInputStore, int) -> None
+        self.store = store
+        self.sourceId = sourceId
+
+    def __len__(self):
+        return len(self.store.offsets[self.sourceId])
+
+    def __getitem__(self, id):
+        if isinstance(id, slice):
+            return [self.store.getAction(self.sourceId, i) for i in range(*id.indices(len(self)))]
+        if id < 0:
+            id += len(self)
+        if id < 0 or id >= len(self):
+            raise IndexError(id)
+        return self.store.getAction(self.sourceId, id)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.store.getAction(self.sourceId, i)
+
+    def select(self, actionType, fromIndex=0, toIndex=None):
+        # type: (SMCApi.ActionType, int, int) -> List[SMCApi.IAction]
+        return [self.store.getAction(self.sourceId, i) for i in self.store.findActions(self.sourceId, actionType, fromIndex, toIndex)]
+
+
+class FileInputStore(object):
+    # append only file of pickled actions with an offset, size and action type index per source, read through mmap
+    # the index is saved next to the file ("<file>.index") by saveIndex and close, an existing file is reopened with it
+    # action types are stored as positions in actionTypes, -1 for any other type
+    actionTypes = (SMCApi.ActionType.START, SMCApi.ActionType.EXECUTE, SMCApi.ActionType.UPDATE, SMCApi.ActionType.STOP)
+    def __init__(self, fileName=None, countSources=0, truncate=False):
+        # type: (str, int, bool) -> None
+        if fileName is None:
+            import tempfile
+            fd, fileName = tempfile.mkstemp(".smcinput", "", getTempDirectory())
+            os.close(fd)
+            self.temporary = True
+            truncate = True
+        else:
+            self.temporary = False
+        self.fileName = fileName
+        self.indexFileName = fileName + ".index"
+        self.map = None
+        self.mapSize = 0
+        self.offsets = []
+        self.sizes = []
+        self.types = []
+        if not truncate and os.path.exists(fileName):
+            self.file = open(fileName, "r+b")
+            self.fileSize = self.loadIndex()
+        else:
+            self.file = open(fileName, "w+b")
+            self.fileSize = 0
+        for _ in range(len(self.offsets), countSources):
+            self.addSource()
+
+    def __deepcopy__(self, memo):
+        # the file is append only and shared by all copies of an input
+        return self
+
+    def loadIndex(self):
+        # type: () -> int
+        import cPickle
+        if not os.path.exists(self.indexFileName):
+            if os.path.getsize(self.fileName) > 0:
+                raise SMCApi.ModuleException("index file {} not found".format(self.indexFileName))
+            return 0
+        with open(self.indexFileName, "rb") as f:
+            index = cPickle.load(f)
+        for offsets, sizes, types in index:
+            self.offsets.append(array.array("l", offsets))
+            self.sizes.append(array.array("l", sizes))
+            self.types.append(array.array("b", types))
+        # actions written after the last saved index are dropped and overwritten
+        return max([offsets[-1] + sizes[-1] for offsets, sizes in zip(self.offsets, self.sizes) if offsets] or [0])
+
+    def saveIndex(self):
+        import cPickle
+        self.file.flush()
+        fileName = "{}.{}".format(self.indexFileName, os.getpid())
+        with open(fileName, "wb") as f:
+            cPickle.dump([(offsets.tostring(), sizes.tostring(), types.tostring())
+                          for offsets, sizes, types in zip(self.offsets, self.sizes, self.types)], f, cPickle.HIGHEST_PROTOCOL)
+        os.rename(fileName, self.indexFileName)
+
+    @classmethod
+    def fromInput(cls, input, fileName=None):
+        # type: (List[List[SMCApi.IAction]], str) -> FileInputStore
+        store = cls(fileName, len(input), True)
+        for sourceId, actions in enumerate(input):
+            store.extend(sourceId, actions)
+        return store
+
+    def addSource(self):
+        # type: () -> int
+        self.offsets.append(array.array("l"))
+        self.sizes.append(array.array("l"))
+        self.types.append(array.array("b"))
+        return len(self.offsets) - 1
+
+    def append(self, sourceId, action):
+        # type: (int, SMCApi.IAction) -> None
+        import cPickle
+        if sourceId < 0 or sourceId >= len(self.offsets):
+            raise SMCApi.ModuleException("sourceId")
+        data = cPickle.dumps(action, cPickle.HIGHEST_PROTOCOL)
+        self.file.seek(self.fileSize)
+        self.file.write(data)
+        self.offsets[sourceId].append(self.fileSize)
+        self.sizes[sourceId].append(len(data))
+        self.types[sourceId].append(self.getTypeCode(action.getType()))
+        self.fileSize += len(data)
+
+    def extend(self, sourceId, actions):
+        # type: (int, List[SMCApi.IAction]) -> None
+        for action in actions:
+            self.append(sourceId, action)
+
+    @classmethod
+    def getTypeCode(cls, actionType):
+        # type: (SMCApi.ActionType) -> int
+        if actionType in cls.actionTypes:
+            return cls.actionTypes.index(actionType)
+        return -1
+
+    def findActions(self, sourceId, actionType, fromIndex=0, toIndex=None):
+        # type: (int, SMCApi.ActionType, int, int) -> List[int]
+        # ids of the actions of the type from fromIndex to toIndex counted among that type, only the index is read
+        typeCode = self.getTypeCode(actionType)
+        ids = (i for i, actionTypeCode in enumerate(self.types[sourceId]) if actionTypeCode == typeCode)
+        return list(itertools.islice(ids, fromIndex, toIndex))
+
+    def getAction(self, sourceId, id):
+        # type: (int, int) -> SMCApi.IAction
+        import cPickle
+        offset = self.offsets[sourceId][id]
+        size = self.sizes[sourceId][id]
+        if offset + size > self.mapSize:
+            self.remap()
+        return cPickle.loads(self.map[offset:offset + size])
+
+    def remap(self):
+        import mmap
+        self.file.flush()
+        if self.map is not None:
+            self.map.close()
+        self.map = mmap.mmap(self.file.fileno(), self.fileSize, access=mmap.ACCESS_READ)
+        self.mapSize = self.fileSize
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, sourceId):
+        if sourceId < 0 or sourceId >= len(self.offsets):
+            raise IndexError(sourceId)
+        return StoredActions(self, sourceId)
+
+    def __iter__(self):
+        for sourceId in range(len(self.offsets)):
+            yield StoredActions(self, sourceId)
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if not self.temporary and not self.file.closed:
+            self.saveIndex()
+        self.file.close()
+        if self.temporary and os.path.exists(self.fileName):
+            os.remove(self.fileName)
+
+
 # noinspection PyAbstractClass
 class ExecutionContextToolImpl(ExecutionContext, SMCApi.ExecutionContextTool):
-    def __init__(self, input=None, managedConfigurations=None, executionContextsOutput=None, executionContexts=None, name="default", type="default"):
-        # type: (List[List[SMCApi.IAction]], List[Configuration], List[SMCApi.IAction], List[Callable[[List[object]], SMCApi.IAction]], str, str) -> None
+    def __init__(self, input=None, managedConfigurations=None, executionContextsOutput=None, executionContexts=None, name="default", type="default",
+                 scheduler=None, maxThreadResults=None, maxWorkInterval=-1, threadSafe=False):
+        # type: (List[List[SMCApi.IAction]], List[Configuration], List[SMCApi.IAction], List[Callable[[List[object]], SMCApi.IAction]], str, str, TactScheduler, int, int, bool) -> None
         # ExecutionContext.__init__(self, self, name)
         SMCApi.FlowControlTool.__init__(self)
         SMCApi.ConfigurationControlTool.__init__(self)
         SMCApi.ExecutionContextTool.__init__(self)
         ExecutionContext.__init__(self, self, name)
         # super(ExecutionContextToolImpl, self).__init__(name)
-        if input is not None:
+        if isinstance(input, FileInputStore):
+            self.input = input
+        elif input is not None:
             self.input = list(input)
         else:
             self.input = []
@@ -914,17 +1761,98 @@ class ExecutionContextToolImpl(ExecutionContext, SMCApi.ExecutionContextTool):
             self.executionContexts = []
         self.name = name
         self.type = type
-        self.modules = []
-        modulesByName = {}
-        for cfg in self.managedConfigurations:
-            modulesByName[cfg.getModule().getName()] = cfg.getModule()
-        modulesByName["Module"] = Module("Module")
-        for name in modulesByName:
-            self.modules.append(modulesByName[name])
-
-        self.configurationControlTool = ConfigurationControlTool(self, self.modules, self.managedConfigurations)
-        # noinspection PyTypeChecker
-        self.flowControlTool = FlowControlTool(self, self.executionContextsOutput, self.executionContexts)
+        self.scheduler = scheduler
+        self.maxThreadResults = maxThreadResults
+        self.maxWorkInterval = maxWorkInterval
+        # time after which isNeedStop is True, set by the watchdog while process runs
+        self.deadline = None
+        # modules and control tools are built on first access
+        self.modules = None
+        self.configurationControlTool = None
+        self.flowControlTool = None
+        self.threadSafe = threadSafe
+        self.initThreads()
+        # source id -> (actions, count of actions) of the last read, None when not recorded
+        # type: Dict[int, tuple]
+        self.readSources = None
+
+    def initThreads(self):
+        # in thread safe mode every thread adds to its own buffer, mergeOutput moves them to output in the order of adding
+        if not self.threadSafe:
+            self.threadLocal = None
+            return
+        import threading
+        self.threadLocal = threading.local()
+        self.threadLock = threading.Lock()
+        # (owner thread, buffer)
+        # type: List[tuple]
+        self.threadBuffers = []
+        # next() of itertools.count is atomic
+        self.sequence = itertools.count()
+        self.threadIds = itertools.count(1)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.threadSafe:
+            self.mergeOutput()
+            state["output"] = self.output
+            for key in ("threadLocal", "threadLock", "threadBuffers", "sequence", "threadIds"):
+                del state[key]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.initThreads()
+
+    def getThreadBuffer(self):
+        # type: () -> List[tuple]
+        buffer = getattr(self.threadLocal, "buffer", None)
+        if buffer is None:
+            import threading
+            buffer = self.threadLocal.buffer = []
+            self.threadLocal.threadId = next(self.threadIds)
+            with self.threadLock:
+                self.threadBuffers.append((threading.current_thread(), buffer))
+        return buffer
+
+    def appendOutput(self, message):
+        # type: (SMCApi.IMessage) -> None
+        if self.threadLocal is None:
+            self.output.append(message)
+        else:
+            self.getThreadBuffer().append((next(self.sequence), message))
+        if metrics is not None:
+            metrics.recordMessage(message)
+
+    def mergeOutput(self):
+        # type: () -> None
+        if self.threadLocal is None:
+            return
+        import heapq
+        with self.threadLock:
+            buffers = []
+            threadBuffers = []
+            for thread, buffer in self.threadBuffers:
+                # only the owner thread appends, so the taken prefix can be removed safely
+                items = buffer[:]
+                del buffer[:len(items)]
+                if items:
+                    buffers.append(items)
+                # a finished thread can not add anything more, its empty buffer is dropped
+                if buffer or thread.is_alive():
+                    threadBuffers.append((thread, buffer))
+            self.threadBuffers = threadBuffers
+        self.output.extend(message for _, message in heapq.merge(*buffers))
+
+    def getModules(self):
+        # type: () -> List[SMCApi.CFGIModule]
+        if self.modules is None:
+            modulesByName = {}
+            for cfg in self.managedConfigurations:
+                modulesByName[cfg.getModule().getName()] = cfg.getModule()
+            modulesByName["Module"] = defaultModule
+            self.modules = list(modulesByName.values())
+        return self.modules
 
     def init(self, configurationTool):
         # type: (ConfigurationToolImpl) -> None
@@ -932,11 +1860,12 @@ class ExecutionContextToolImpl(ExecutionContext, SMCApi.ExecutionContextTool):
         self.setConfiguration(self.configuration)
 
     def getOutput(self):
+        self.mergeOutput()
         return self.output
 
     def add(self, messageType, value):
         # type: (SMCApi.MessageType, object) -> None
-        self.output.append(Message(Value(value), messageType))
+        self.appendOutput(Message(Value(value), messageType))
 
     def addMessage(self, value):
         if not value:
@@ -944,9 +1873,9 @@ class ExecutionContextToolImpl(ExecutionContext, SMCApi.ExecutionContextTool):
         if isinstance(value, list):
             date = datetime.datetime.now()
             for element in value:
-                self.output.append(Message(Value(element), SMCApi.MessageType.DATA, date))
+                self.appendOutput(Message(Value(element), SMCApi.MessageType.DATA, date))
         else:
-            self.output.append(Message(Value(value), SMCApi.MessageType.DATA))
+            self.appendOutput(Message(Value(value), SMCApi.MessageType.DATA))
 
     def addError(self, value):
         if not value:
@@ -954,14 +1883,14 @@ class ExecutionContextToolImpl(ExecutionContext, SMCApi.ExecutionContextTool):
         if isinstance(value, list):
             date = datetime.datetime.now()
             for element in value:
-                self.output.append(Message(Value(element), SMCApi.MessageType.ERROR, date))
+                self.appendOutput(Message(Value(element), SMCApi.MessageType.ERROR, date))
         else:
-            self.output.append(Message(Value(value), SMCApi.MessageType.ERROR))
+            self.appendOutput(Message(Value(value), SMCApi.MessageType.ERROR))
 
     def addLog(self, value):
         if not value:
             raise SMCApi.ModuleException("value")
-        self.output.append(Message(Value(value), SMCApi.MessageType.LOG))
+        self.appendOutput(Message(Value(value), SMCApi.MessageType.LOG))
 
     def countSource(self):
         return len(self.input)
@@ -977,9 +1906,13 @@ class ExecutionContextToolImpl(ExecutionContext, SMCApi.ExecutionContextTool):
     def getMessagesAll(self, sourceId):
         if sourceId < 0 or self.countSource() <= sourceId:
             raise SMCApi.ModuleException("sourceId")
+        if metrics is not None:
+            metrics.increment("smc_source_reads_total", str(sourceId), labelName="source")
         data = self.input[sourceId]
         if not data:
             data = []
+        if self.readSources is not None:
+            self.readSources[sourceId] = (data, len(data))
         return data
 
     def countCommands(self, sourceId):
@@ -989,21 +1922,32 @@ class ExecutionContextToolImpl(ExecutionContext, SMCApi.ExecutionContextTool):
         return 0
 
     def getMessages(self, sourceId, fromIndex=-1, toIndex=-1):
+        if fromIndex >= 0 and toIndex >= 0:
+            actions = self.getMessagesAll(sourceId)
+            if isinstance(actions, StoredActions):
+                # the type index of the store finds the range, only the actions in it are read from the file
+                return self.filter(actions.select(SMCApi.ActionType.EXECUTE, fromIndex, max(fromIndex, toIndex)), SMCApi.ActionType.EXECUTE,
+                                   SMCApi.MessageType.DATA)
+            # stop reading the source once the range is complete
+            return list(itertools.islice(self.iterFilter(actions, SMCApi.ActionType.EXECUTE, SMCApi.MessageType.DATA),
+                                         fromIndex, max(fromIndex, toIndex)))
         lst = self.filter(self.getMessagesAll(sourceId), SMCApi.ActionType.EXECUTE, SMCApi.MessageType.DATA)
         if fromIndex != -1 or toIndex != -1:
             lst = lst[fromIndex: toIndex]
         return lst
 
-    # noinspection PyMethodMayBeStatic
     def filter(self, actions, actionType=None, messageType=None):
         # type: (List[SMCApi.IAction], SMCApi.ActionType, SMCApi.MessageType)->List[SMCApi.IAction]
-        result = []
+        return list(self.iterFilter(actions, actionType, messageType))
+
+    # noinspection PyMethodMayBeStatic
+    def iterFilter(self, actions, actionType=None, messageType=None):
+        # type: (List[SMCApi.IAction], SMCApi.ActionType, SMCApi.MessageType)->Iterator[SMCApi.IAction]
         for a in actions:
             if actionType and actionType != a.getType():
                 continue
             collect = filter(lambda m: not messageType or messageType == m.getMessageType(), a.getMessages())
-            result.append(Action(collect, a.getType()))
-        return result
+            yield Action(collect, a.getType())
 
     def getCommands(self, sourceId, fromIndex=-1, toIndex=-1):
         lst = [Command(self.getMessagesAll(sourceId), SMCApi.CommandType.EXECUTE)]
@@ -1019,26 +1963,66 @@ class ExecutionContextToolImpl(ExecutionContext, SMCApi.ExecutionContextTool):
         while True:
             if not action:
                 break
-            if not action.getMessages() or len(action.getMessages()) == 0:
+            if isinstance(action, Action):
+                if not action.messages:
+                    break
+                typeCounts = action.getTypeCounts()
+                if SMCApi.MessageType.ACTION_ERROR in typeCounts or SMCApi.MessageType.ERROR in typeCounts:
+                    break
+            elif not action.getMessages() or len(action.getMessages()) == 0:
                 break
-            if any(SMCApi.MessageType.ACTION_ERROR == m.getMessageType() or SMCApi.MessageType.ERROR == m.getMessageType()
-                   for m in action.getMessages()):
+            elif any(SMCApi.MessageType.ACTION_ERROR == m.getMessageType() or SMCApi.MessageType.ERROR == m.getMessageType()
+                     for m in action.getMessages()):
                 break
             result = False
             break
         return result
 
+    # noinspection PyMethodMayBeStatic
+    def countByType(self, action):
+        # type: (SMCApi.IAction) -> Dict[SMCApi.MessageType, int]
+        if not action:
+            return {}
+        if isinstance(action, Action):
+            return dict(action.getTypeCounts())
+        result = {}
+        for m in action.getMessages():
+            result[m.getMessageType()] = result.get(m.getMessageType(), 0) + 1
+        return result
+
+    def errorsIn(self, actions):
+        # type: (List[SMCApi.IAction]) -> List[int]
+        return [i for i, action in enumerate(actions) if self.isError(action)]
+
     def getConfigurationControlTool(self):
+        if self.configurationControlTool is None:
+            self.configurationControlTool = ConfigurationControlTool(self, self.getModules(), self.managedConfigurations)
         return self.configurationControlTool
 
     def getFlowControlTool(self):
+        if self.flowControlTool is None:
+            # noinspection PyTypeChecker
+            self.flowControlTool = FlowControlTool(self, self.executionContextsOutput, self.executionContexts, self.scheduler,
+                                                   self.maxThreadResults, self.threadSafe)
+            self.scheduler = self.flowControlTool.scheduler
         return self.flowControlTool
 
+    def nextTact(self):
+        if self.scheduler is not None:
+            if self.flowControlTool is not None:
+                with self.flowControlTool.lock:
+                    self.scheduler.advance()
+            else:
+                self.scheduler.advance()
+
     def isNeedStop(self):
-        return False
+        return self.deadline is not None and time.time() > self.deadline
 
     def getThreadId(self):
-        return 1
+        if self.threadLocal is None:
+            return 1
+        self.getThreadBuffer()
+        return self.threadLocal.threadId
 
     def getNickName(self):
         return None
@@ -1074,14 +2058,266 @@ class ConfigurationControlTool(SMCApi.ConfigurationControlTool):
         self.executionContextTool.add(SMCApi.MessageType.CONFIGURATION_CONTROL_CONFIGURATION_REMOVE, configuration.getName())
 
 
+class LazyValues(list):
+    # list of Value objects, raw values are boxed when the callee reads them
+    # any other list operation boxes all values first and then works on a plain list of Values
+    def __init__(self, values):
+        # type: (List[object]) -> None
+        list.__init__(self, values)
+        self.lazy = True
+
+    def __getitem__(self, id):
+        if isinstance(id, slice):
+            return [self[i] for i in range(*id.indices(len(self)))]
+        value = list.__getitem__(self, id)
+        if self.lazy and not isinstance(value, Value):
+            value = Value(value)
+            list.__setitem__(self, id, value)
+        return value
+
+    def __getslice__(self, i, j):
+        return self.__getitem__(slice(i, j))
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self[i]
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def boxAll(self):
+        if self.lazy:
+            for i in xrange(len(self)):
+                self.__getitem__(i)
+            self.lazy = False
+
+
+def boxingMethod(name):
+    method = getattr(list, name)
+
+    def call(self, *args):
+        self.boxAll()
+        return method(self, *args)
+
+    call.__name__ = name
+    return call
+
+
+for name in ("__add__", "__iadd__", "__mul__", "__rmul__", "__imul__", "__contains__", "__eq__", "__ne__", "__lt__", "__le__", "__gt__",
+             "__ge__", "__reversed__", "__setitem__", "__setslice__", "__delitem__", "__delslice__", "__repr__", "append", "extend", "insert",
+             "pop", "remove", "index", "count", "reverse", "sort"):
+    setattr(LazyValues, name, boxingMethod(name))
+del name
+
+
+class TactScheduler(object):
+    # discrete-event model of parallel threads: one tact passes per Process.execute call
+    def __init__(self, durations=None, defaultDuration=0, measure=False, tactDuration=0.001):
+        # type: (Dict[int, int], int, bool, float) -> None
+        if durations:
+            self.durations = dict(durations)
+        else:
+            self.durations = {}
+        self.defaultDuration = defaultDuration
+        self.measure = measure
+        self.tactDuration = tactDuration
+        self.tact = 0
+        # type: Dict[int, tuple]
+        self.active = {}
+        # running aggregates of completed threads, nothing is kept per thread
+        self.completed = 0
+        self.latencySum = 0
+        self.latencyMax = 0
+
+    def getTact(self):
+        return self.tact
+
+    def setDuration(self, managedId, tacts):
+        # type: (int, int) -> None
+        if tacts < 0:
+            raise SMCApi.ModuleException("tacts")
+        self.durations[managedId] = tacts
+
+    def getDuration(self, managedId, elapsed):
+        # type: (int, float) -> int
+        if self.measure:
+            return int(math.ceil(elapsed / self.tactDuration))
+        return self.durations.get(managedId, self.defaultDuration)
+
+    def schedule(self, threadId, duration, waitingTacts=0):
+        # type: (int, int, int) -> None
+        thread = (threadId, self.tact, self.tact + waitingTacts + duration)
+        if thread[2] <= self.tact:
+            self.complete(thread)
+        else:
+            self.active[threadId] = thread
+
+    def complete(self, thread):
+        # type: (tuple) -> None
+        latency = thread[2] - thread[1]
+        self.completed += 1
+        self.latencySum += latency
+        self.latencyMax = max(self.latencyMax, latency)
+
+    def isActive(self, threadId):
+        return threadId in self.active
+
+    def advance(self, tacts=1):
+        # type: (int) -> None
+        self.tact += tacts
+        for threadId, thread in self.active.items():
+            if thread[2] <= self.tact:
+                del self.active[threadId]
+                self.complete(thread)
+
+    def release(self, threadId):
+        if threadId in self.active:
+            del self.active[threadId]
+
+    def getStatistics(self):
+        # type: () -> Dict[str, float]
+        return {
+            "tacts": self.tact,
+            "active": len(self.active),
+            "completed": self.completed,
+            "throughput": float(self.completed) / self.tact if self.tact else 0.0,
+            "latencyAvg": float(self.latencySum) / self.completed if self.completed else 0.0,
+            "latencyMax": self.latencyMax,
+        }
+
+
+def estimateMessageSize(message):
+    # type: (SMCApi.IMessage) -> int
+    return sys.getsizeof(message) + sys.getsizeof(message.getValue())
+
+
+def estimateActionSize(action):
+    # type: (SMCApi.IAction) -> int
+    if action is None:
+        return 0
+    return sys.getsizeof(action) + sum(estimateMessageSize(m) for m in action.getMessages())
+
+
+class ThreadResultStore(object):
+    # results of parallel threads by thread id and managed id, least recently used threads are evicted first
+    def __init__(self, maxThreads=None):
+        # type: (int) -> None
+        if maxThreads is not None and maxThreads < 1:
+            raise SMCApi.ModuleException("maxThreads")
+        self.maxThreads = maxThreads
+        # type: collections.OrderedDict[int, Dict[int, SMCApi.IAction]]
+        self.results = collections.OrderedDict()
+        # type: Dict[int, int]
+        self.sizes = {}
+        self.size = 0
+        self.evicted = 0
+
+    def put(self, threadId, managedId, action):
+        # type: (int, int, SMCApi.IAction) -> None
+        if threadId in self.results:
+            results = self.results.pop(threadId)
+        else:
+            results = {}
+            self.sizes[threadId] = 0
+        actionSize = estimateActionSize(action)
+        if managedId in results:
+            actionSize -= estimateActionSize(results[managedId])
+        results[managedId] = action
+        self.results[threadId] = results
+        self.sizes[threadId] += actionSize
+        self.size += actionSize
+        if self.maxThreads is not None:
+            while len(self.results) > self.maxThreads:
+                self.release(next(iter(self.results)))
+                self.evicted += 1
+
+    def contains(self, threadId, managedId=None):
+        # type: (int, int) -> bool
+        if managedId is None:
+            return threadId in self.results
+        return threadId in self.results and managedId in self.results[threadId]
+
+    def get(self, threadId, managedId):
+        # type: (int, int) -> SMCApi.IAction
+        if threadId not in self.results:
+            return None
+        results = self.results.pop(threadId)
+        self.results[threadId] = results
+        return results.get(managedId)
+
+    def release(self, threadId):
+        # type: (int) -> None
+        if threadId not in self.results:
+            return
+        del self.results[threadId]
+        self.size -= self.sizes.pop(threadId)
+
+    def countThreads(self):
+        return len(self.results)
+
+    def getMemoryUsage(self, threadId=None):
+        # type: (int) -> int
+        if threadId is None:
+            return self.size
+        return self.sizes.get(threadId, 0)
+
+    def getEvicted(self):
+        return self.evicted
+
+
+class NoLock(object):
+    # stands in for a lock when thread safety is off
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
 class FlowControlTool(SMCApi.FlowControlTool):
-    def __init__(self, executionContextTool, executionContextsOutput, executionContexts=None):
-        # type: (ExecutionContextToolImpl, List[SMCApi.IAction], List[Callable[[List[object]], SMCApi.IAction]]) -> None
+    executeNowMessageTypes = {
+        SMCApi.CommandType.START: SMCApi.MessageType.FLOW_CONTROL_EXECUTE_NOW_START,
+        SMCApi.CommandType.EXECUTE: SMCApi.MessageType.FLOW_CONTROL_EXECUTE_NOW_EXECUTE,
+        SMCApi.CommandType.UPDATE: SMCApi.MessageType.FLOW_CONTROL_EXECUTE_NOW_UPDATE,
+        SMCApi.CommandType.STOP: SMCApi.MessageType.FLOW_CONTROL_EXECUTE_NOW_STOP,
+    }
+    executeParallelMessageTypes = {
+        SMCApi.CommandType.START: SMCApi.MessageType.FLOW_CONTROL_EXECUTE_PARALLEL_START,
+        SMCApi.CommandType.EXECUTE: SMCApi.MessageType.FLOW_CONTROL_EXECUTE_PARALLEL_EXECUTE,
+        SMCApi.CommandType.UPDATE: SMCApi.MessageType.FLOW_CONTROL_EXECUTE_PARALLEL_UPDATE,
+        SMCApi.CommandType.STOP: SMCApi.MessageType.FLOW_CONTROL_EXECUTE_PARALLEL_STOP,
+    }
+
+    def __init__(self, executionContextTool, executionContextsOutput, executionContexts=None, scheduler=None, maxThreadResults=None, threadSafe=False):
+        # type: (ExecutionContextToolImpl, List[SMCApi.IAction], List[Callable[[List[object]], SMCApi.IAction]], TactScheduler, int, bool) -> None
         self.executionContextTool = executionContextTool
         self.executionContextsOutput = executionContextsOutput
         self.executionContexts = executionContexts
         self.executeInParalel = dict()
+        self.threadResults = ThreadResultStore(maxThreadResults)
         self.threadIdGenerator = 0
+        if scheduler is None:
+            scheduler = TactScheduler()
+        self.scheduler = scheduler
+        self.threadSafe = threadSafe
+        self.initLock()
+
+    def initLock(self):
+        # guards the thread map, thread results and scheduler
+        if self.threadSafe:
+            import threading
+            self.lock = threading.RLock()
+        else:
+            self.lock = NoLock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.initLock()
 
     def countManagedExecutionContexts(self):
         return len(self.executionContextsOutput)
@@ -1089,22 +2325,39 @@ class FlowControlTool(SMCApi.FlowControlTool):
     def executeNow(self, typev, managedId, values):
         if not typev:
             raise SMCApi.ModuleException("type")
-        if managedId < 0 or managedId >= self.countManagedExecutionContexts():
+        if managedId < 0 or managedId >= len(self.executionContextsOutput):
             raise SMCApi.ModuleException("managedId")
-        messageType = SMCApi.MessageType.FLOW_CONTROL_EXECUTE_NOW_START
-        if typev == SMCApi.CommandType.START:
-            messageType = SMCApi.MessageType.FLOW_CONTROL_EXECUTE_NOW_START
-        elif typev == SMCApi.CommandType.EXECUTE:
-            messageType = SMCApi.MessageType.FLOW_CONTROL_EXECUTE_NOW_EXECUTE
-        elif typev == SMCApi.CommandType.UPDATE:
-            messageType = SMCApi.MessageType.FLOW_CONTROL_EXECUTE_NOW_UPDATE
-        elif typev == SMCApi.CommandType.STOP:
-            messageType = SMCApi.MessageType.FLOW_CONTROL_EXECUTE_NOW_STOP
-        self.executionContextTool.add(messageType, managedId)
+        self.dispatchNow(typev, managedId, values)
+
+    def executeMany(self, commands):
+        # type: (List[tuple]) -> None
+        commands = list(commands)
+        count = len(self.executionContextsOutput)
+        for typev, managedId, _ in commands:
+            if not typev:
+                raise SMCApi.ModuleException("type")
+            if managedId < 0 or managedId >= count:
+                raise SMCApi.ModuleException("managedId")
+        if metrics is not None:
+            metrics.increment("smc_flow_control_calls_total", "executeMany")
+        for typev, managedId, values in commands:
+            self.dispatchNow(typev, managedId, values)
+
+    def dispatchNow(self, typev, managedId, values):
+        # arguments must already be validated
+        self.executionContextTool.add(
+            self.executeNowMessageTypes.get(typev, SMCApi.MessageType.FLOW_CONTROL_EXECUTE_NOW_START), managedId)
+        if metrics is not None:
+            metrics.increment("smc_flow_control_calls_total", "executeNow")
         if self.executionContexts:
             if type(values) == list:
-                values = map(lambda v: Value(v), values)
-            self.executionContextsOutput[managedId] = self.executionContexts[managedId](values)
+                values = LazyValues(values)
+            if metrics is not None:
+                startTime = time.time()
+                self.executionContextsOutput[managedId] = self.executionContexts[managedId](values)
+                metrics.observe("smc_flow_control_seconds", time.time() - startTime, "executeNow")
+            else:
+                self.executionContextsOutput[managedId] = self.executionContexts[managedId](values)
 
     def executeParallel(self, typev, managedIds, values, waitingTacts=0, maxWorkInterval=-1):
         if not typev:
@@ -1113,50 +2366,81 @@ class FlowControlTool(SMCApi.FlowControlTool):
             raise SMCApi.ModuleException("managedIds")
         if waitingTacts < 0:
             raise SMCApi.ModuleException("waitingTacts")
+        count = len(self.executionContextsOutput)
         for managedId in managedIds:
-            if managedId < 0 or managedId >= self.countManagedExecutionContexts():
+            if managedId < 0 or managedId >= count:
                 raise SMCApi.ModuleException("managedId")
-        messageType = SMCApi.MessageType.FLOW_CONTROL_EXECUTE_PARALLEL_START
-        if typev == SMCApi.CommandType.START:
-            messageType = SMCApi.MessageType.FLOW_CONTROL_EXECUTE_PARALLEL_START
-        elif typev == SMCApi.CommandType.EXECUTE:
-            messageType = SMCApi.MessageType.FLOW_CONTROL_EXECUTE_PARALLEL_EXECUTE
-        elif typev == SMCApi.CommandType.UPDATE:
-            messageType = SMCApi.MessageType.FLOW_CONTROL_EXECUTE_PARALLEL_UPDATE
-        elif typev == SMCApi.CommandType.STOP:
-            messageType = SMCApi.MessageType.FLOW_CONTROL_EXECUTE_PARALLEL_STOP
+        if metrics is not None:
+            metrics.increment("smc_flow_control_calls_total", "executeParallel")
+        messageType = self.executeParallelMessageTypes.get(typev, SMCApi.MessageType.FLOW_CONTROL_EXECUTE_PARALLEL_START)
         for managedId in managedIds:
             self.executionContextTool.add(messageType, managedId)
         self.executionContextTool.add(SMCApi.MessageType.FLOW_CONTROL_EXECUTE_PARALLEL_WAITING_TACTS, waitingTacts)
-        self.threadIdGenerator += 1
-        self.executeInParalel[self.threadIdGenerator] = managedIds
+        with self.lock:
+            self.threadIdGenerator += 1
+            threadId = self.threadIdGenerator
+            self.executeInParalel[threadId] = managedIds
+        duration = 0
         if self.executionContexts:
             if type(values) == list:
-                values = map(lambda v: Value(v), values)
+                values = LazyValues(values)
             for managedId in managedIds:
-                self.executionContextsOutput[managedId] = self.executionContexts[managedId](values)
-        return self.threadIdGenerator
+                startTime = time.time()
+                action = self.executionContexts[managedId](values)
+                elapsed = time.time() - startTime
+                with self.lock:
+                    self.threadResults.put(threadId, managedId, action)
+                    self.executionContextsOutput[managedId] = action
+                    duration = max(duration, self.scheduler.getDuration(managedId, elapsed))
+                if metrics is not None:
+                    metrics.observe("smc_flow_control_seconds", elapsed, "executeParallel")
+        else:
+            with self.lock:
+                for managedId in managedIds:
+                    duration = max(duration, self.scheduler.getDuration(managedId, 0.0))
+        with self.lock:
+            self.scheduler.schedule(threadId, duration, waitingTacts)
+        return threadId
 
     def isThreadActive(self, threadId):
-        return False
+        with self.lock:
+            return self.scheduler.isActive(threadId)
 
-    def getMessagesFromExecuted(self, threadId=0, managedId=0):
+    def getExecuted(self, threadId, managedId):
+        # type: (int, int) -> List[SMCApi.IAction]
         if managedId < 0 or managedId >= self.countManagedExecutionContexts():
             raise SMCApi.ModuleException("managedId")
-        return self.executionContextTool.filter([self.executionContextsOutput[managedId]], SMCApi.ActionType.EXECUTE, SMCApi.MessageType.DATA)
+        if threadId < 1 or threadId > self.threadIdGenerator:
+            # the last result of executeNow or executeParallel, None before the first call
+            if self.executionContextsOutput[managedId] is None:
+                return []
+            return [self.executionContextsOutput[managedId]]
+        with self.lock:
+            if self.scheduler.isActive(threadId) or not self.threadResults.contains(threadId, managedId):
+                return []
+            return [self.threadResults.get(threadId, managedId)]
+
+    def getMessagesFromExecuted(self, threadId=0, managedId=0):
+        return self.executionContextTool.filter(self.getExecuted(threadId, managedId), SMCApi.ActionType.EXECUTE, SMCApi.MessageType.DATA)
 
     def getCommandsFromExecuted(self, threadId=0, managedId=0):
-        if managedId < 0 or managedId >= self.countManagedExecutionContexts():
-            raise SMCApi.ModuleException("managedId")
-        return [Command(self.executionContextTool.filter([self.executionContextsOutput[managedId]]), SMCApi.CommandType.EXECUTE)]
+        return [Command(self.executionContextTool.filter(self.getExecuted(threadId, managedId)), SMCApi.CommandType.EXECUTE)]
 
     def releaseThread(self, threadId):
-        if threadId in self.executeInParalel:
-            del self.executeInParalel[threadId]
+        with self.lock:
+            if threadId in self.executeInParalel:
+                del self.executeInParalel[threadId]
+            self.scheduler.release(threadId)
+            self.threadResults.release(threadId)
 
     def releaseThreadCache(self, threadId):
-        if threadId in self.executeInParalel:
-            del self.executeInParalel[threadId]
+        with self.lock:
+            self.threadResults.release(threadId)
+
+    def getThreadResultsMemoryUsage(self, threadId=None):
+        # type: (int) -> int
+        with self.lock:
+            return self.threadResults.getMemoryUsage(threadId)
 
     def getManagedExecutionContext(self, id):
         return None
@@ -1174,11 +2458,182 @@ class FlowControlTool(SMCApi.FlowControlTool):
         return None
 
 
+class ModuleReloader(object):
+    # polls the mtime of the module source and swaps the class of the live module instance
+    def __init__(self, module, pollInterval=0.5):
+        # type: (SMCApi.Module, float) -> None
+        self.module = module
+        self.moduleName = type(module).__module__
+        self.className = type(module).__name__
+        if self.moduleName == "__main__" or self.moduleName not in sys.modules:
+            raise SMCApi.ModuleException("module class must be defined in an importable module")
+        fileName = sys.modules[self.moduleName].__file__
+        if fileName.endswith(".pyc") or fileName.endswith(".pyo"):
+            fileName = fileName[:-1]
+        self.fileName = fileName
+        self.mtime = os.path.getmtime(self.fileName)
+        self.pollInterval = pollInterval
+        self.lastPoll = time.time()
+        self.reloads = 0
+
+    def isChanged(self):
+        # type: () -> bool
+        now = time.time()
+        if now - self.lastPoll < self.pollInterval:
+            return False
+        self.lastPoll = now
+        try:
+            return os.path.getmtime(self.fileName) != self.mtime
+        except OSError:
+            return False
+
+    def reload(self):
+        # type: () -> None
+        self.mtime = os.path.getmtime(self.fileName)
+        pyModule = reload(sys.modules[self.moduleName])
+        moduleClass = getattr(pyModule, self.className, None)
+        if moduleClass is None:
+            raise SMCApi.ModuleException("class {} not found in {}".format(self.className, self.fileName))
+        self.module.__class__ = moduleClass
+        self.reloads += 1
+
+    def getReloads(self):
+        return self.reloads
+
+
+class WorkIntervalExceeded(Exception):
+    # raised in the thread of module.process by an interrupting watchdog, the interpreter creates it without arguments
+    defaultMessage = "work interval exceeded"
+
+    def __init__(self, *args):
+        if not args:
+            args = (self.defaultMessage,)
+        super(WorkIntervalExceeded, self).__init__(*args)
+
+
+class Watchdog(object):
+    # checks module.process against maxWorkInterval (ms) of the execution context tool
+    def __init__(self, interrupt=False):
+        # type: (bool) -> None
+        self.interrupt = interrupt
+        # (execution context name, elapsed ms, max work interval ms)
+        # type: List[tuple]
+        self.overruns = []
+        self.calls = 0
+        self.lock = None
+        self.timer = None
+        self.threadId = None
+        self.interrupted = False
+        self.startTime = 0.0
+        self.maxWorkInterval = None
+
+    def begin(self, executionContextTool):
+        # type: (ExecutionContextToolImpl) -> None
+        self.calls += 1
+        self.startTime = time.time()
+        maxWorkInterval = self.maxWorkInterval = executionContextTool.getMaxWorkInterval()
+        if maxWorkInterval is None or maxWorkInterval < 0:
+            executionContextTool.deadline = None
+            return
+        executionContextTool.deadline = self.startTime + maxWorkInterval / 1000.0
+        if self.interrupt:
+            import thread
+            import threading
+            if self.lock is None:
+                self.lock = threading.Lock()
+            self.threadId = thread.get_ident()
+            self.interrupted = False
+            self.timer = threading.Timer(maxWorkInterval / 1000.0, self.fire)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def fire(self):
+        import ctypes
+        with self.lock:
+            if self.timer is None:
+                return
+            self.interrupted = True
+            # only the class can be passed, the message goes with a subclass
+            exception = type("WorkIntervalExceeded", (WorkIntervalExceeded,), {"defaultMessage": "work interval exceeded: {:.1f} ms, maxWorkInterval {} ms"
+                             .format((time.time() - self.startTime) * 1000.0, self.maxWorkInterval)})
+            ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_long(self.threadId), ctypes.py_object(exception))
+
+    def end(self, executionContextTool):
+        # type: (ExecutionContextToolImpl) -> None
+        # the exception can still arrive before the timer is stopped, process has returned then, so it is dropped and the stop repeated
+        while True:
+            try:
+                elapsed = self.stopTimer()
+                break
+            except WorkIntervalExceeded:
+                pass
+        maxWorkInterval = executionContextTool.getMaxWorkInterval()
+        executionContextTool.deadline = None
+        if maxWorkInterval is not None and 0 <= maxWorkInterval < elapsed:
+            self.overruns.append((executionContextTool.getName(), elapsed, maxWorkInterval))
+            if metrics is not None:
+                metrics.increment("smc_work_interval_overruns_total", executionContextTool.getName(), labelName="context")
+
+    def stopTimer(self):
+        # type: () -> float
+        elapsed = (time.time() - self.startTime) * 1000.0
+        if self.timer is not None:
+            import ctypes
+            with self.lock:
+                self.timer.cancel()
+                self.timer = None
+                if self.interrupted:
+                    # drop the exception if it was not delivered before process returned
+                    ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_long(self.threadId), None)
+        return elapsed
+
+    def getOverruns(self):
+        # type: () -> List[tuple]
+        return self.overruns
+
+
 class Process:
-    def __init__(self, configurationTool, module):
-        # type: (ConfigurationToolImpl, SMCApi.Module) -> None
+    def __init__(self, configurationTool, module, reloadInterval=None, profiler=None, watchdog=None, history=None):
+        # type: (ConfigurationToolImpl, SMCApi.Module, float, StackSampler, Watchdog, TickHistory) -> None
         self.configurationTool = configurationTool
         self.module = module
+        self.profiler = profiler
+        self.history = history
+        if watchdog is None:
+            watchdog = Watchdog()
+        self.watchdog = watchdog
+        if reloadInterval is not None and module is not None:
+            self.reloader = ModuleReloader(module, reloadInterval)
+        else:
+            self.reloader = None
+
+    def reloadIfChanged(self):
+        # type: () -> List[SMCApi.IMessage]
+        if self.reloader is None or not self.reloader.isChanged():
+            return []
+        try:
+            self.reloader.reload()
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            return [Message(Value("reload error {}".format(e)), SMCApi.MessageType.ACTION_ERROR)]
+        return self.update()
+
+    def watch(self, executionContextTool, ticks=-1, tickInterval=0.0, callback=None):
+        # type: (ExecutionContextToolImpl, int, float, Callable[[List[SMCApi.IMessage]], None]) -> List[List[SMCApi.IMessage]]
+        results = []
+        tick = 0
+        while ticks < 0 or tick < ticks:
+            messages = self.reloadIfChanged()
+            messages.extend(self.execute(executionContextTool))
+            if callback is not None:
+                callback(messages)
+            else:
+                results.append(messages)
+            tick += 1
+            if tickInterval > 0:
+                time.sleep(tickInterval)
+        return results
 
     def fullLifeCycle(self, executionContextTool):
         # type: (ExecutionContextToolImpl) -> List[SMCApi.IMessage]
@@ -1206,11 +2661,15 @@ class Process:
         if self.module is None:
             return result
         result.append(Message(Value(1), SMCApi.MessageType.ACTION_START))
+        startTime = time.time()
         try:
             self.module.start(self.configurationTool)
         except Exception as e:
             result.append(Message(Value("error {}".format(e.message)), SMCApi.MessageType.ACTION_ERROR))
+            import traceback
             traceback.print_exc()
+        if metrics is not None:
+            metrics.observe("smc_process_seconds", time.time() - startTime, "start")
         result.append(Message(Value(1), SMCApi.MessageType.ACTION_STOP))
         return result
 
@@ -1222,17 +2681,41 @@ class Process:
         self.configurationTool.init(executionContextTool)
         executionContextTool.init(self.configurationTool)
         result.append(Message(Value(1), SMCApi.MessageType.ACTION_START))
+        if self.history is not None:
+            self.history.begin(self.configurationTool, executionContextTool)
+        startTime = time.time()
         try:
+            # messages added since the last tick (start, update) belong to the history, not to this result
+            executionContextTool.mergeOutput()
             output = list(executionContextTool.output)
             executionContextTool.output = []
-            self.module.process(self.configurationTool, executionContextTool)
+            self.watchdog.begin(executionContextTool)
+            try:
+                if self.profiler is not None:
+                    self.profiler.start(Process.execute.__func__.__code__)
+                    try:
+                        self.module.process(self.configurationTool, executionContextTool)
+                    finally:
+                        self.profiler.stop()
+                else:
+                    self.module.process(self.configurationTool, executionContextTool)
+            finally:
+                self.watchdog.end(executionContextTool)
+            executionContextTool.mergeOutput()
             result.extend(executionContextTool.output)
             output.extend(executionContextTool.output)
             executionContextTool.output = output
         except Exception as e:
             result.append(Message(Value("error {}".format(e.message)), SMCApi.MessageType.ACTION_ERROR))
+            import traceback
             traceback.print_exc()
+        elapsed = time.time() - startTime
+        if metrics is not None:
+            metrics.observe("smc_process_seconds", elapsed, "execute")
+        executionContextTool.nextTact()
         result.append(Message(Value(1), SMCApi.MessageType.ACTION_STOP))
+        if self.history is not None:
+            self.history.end(self.configurationTool, executionContextTool, result, elapsed)
         return result
 
     def update(self):
@@ -1241,11 +2724,17 @@ class Process:
         if self.module is None:
             return result
         result.append(Message(Value(1), SMCApi.MessageType.ACTION_START))
+        if isinstance(self.configurationTool, ConfigurationToolImpl):
+            self.configurationTool.clearSettingsCache()
+        startTime = time.time()
         try:
             self.module.update(self.configurationTool)
         except Exception as e:
             result.append(Message(Value("error {}".format(e.message)), SMCApi.MessageType.ACTION_ERROR))
+            import traceback
             traceback.print_exc()
+        if metrics is not None:
+            metrics.observe("smc_process_seconds", time.time() - startTime, "update")
         result.append(Message(Value(1), SMCApi.MessageType.ACTION_STOP))
         return result
 
@@ -1255,10 +2744,14 @@ class Process:
         if self.module is None:
             return result
         result.append(Message(Value(1), SMCApi.MessageType.ACTION_START))
+        startTime = time.time()
         try:
             self.module.stop(self.configurationTool)
         except Exception as e:
             result.append(Message(Value("error {}".format(e.message)), SMCApi.MessageType.ACTION_ERROR))
+            import traceback
             traceback.print_exc()
+        if metrics is not None:
+            metrics.observe("smc_process_seconds", time.time() - startTime, "stop")
         result.append(Message(Value(1), SMCApi.MessageType.ACTION_STOP))
         return result
@@ -0,0 +1,294 @@
+"""
+graph executor for smc modules: configurations wired through their execution context sources run level by level,
+event driven sources wake up their readers only when the upstream node produced output
+"""
+import time
+
+import SMCApi
+import SmcEmulator
+
+MYPY = False
+if MYPY:
+    from typing import Dict, List
+    from SmcEmulator import Configuration, ExecutionContext
+
+
+class SourceHistory(object):
+    # ring buffer of the last outputs of a node, readers keep their own sequence cursor
+    def __init__(self, capacity=1):
+        # type: (int) -> None
+        if capacity < 1:
+            raise SMCApi.ModuleException("capacity")
+        self.capacity = capacity
+        self.buffer = [None] * capacity
+        self.count = 0
+
+    def append(self, action):
+        # type: (SMCApi.IAction) -> None
+        self.buffer[self.count % self.capacity] = action
+        self.count += 1
+
+    def getRange(self, fromSeq, toSeq):
+        # type: (int, int) -> List[SMCApi.IAction]
+        fromSeq = max(fromSeq, self.count - self.capacity, 0)
+        return [self.buffer[seq % self.capacity] for seq in range(fromSeq, min(toSeq, self.count))]
+
+    def read(self, getType, countLast, cursor):
+        # type: (SMCApi.SourceGetType, int, int) -> tuple
+        if getType == SMCApi.SourceGetType.LAST:
+            return self.getRange(self.count - countLast, self.count), self.count
+        if cursor >= self.count:
+            return [], cursor
+        if getType == SMCApi.SourceGetType.NEW_ALL:
+            return self.getRange(cursor, self.count), self.count
+        return self.getRange(self.count - 1, self.count), self.count
+
+    @staticmethod
+    def getCapacity(getType, countLast, historySize):
+        # type: (SMCApi.SourceGetType, int, int) -> int
+        if getType == SMCApi.SourceGetType.LAST:
+            return countLast
+        if getType == SMCApi.SourceGetType.NEW_ALL:
+            return historySize
+        return 1
+
+
+class GraphNode(object):
+    def __init__(self, configuration, module, executionContext=None):
+        # type: (Configuration, SMCApi.Module, ExecutionContext) -> None
+        if executionContext is None:
+            if configuration.countExecutionContexts() == 0:
+                raise SMCApi.ModuleException("configuration {} has no execution contexts".format(configuration.getName()))
+            executionContext = configuration.getExecutionContext(0)
+        self.configuration = configuration
+        self.executionContext = executionContext
+        self.configurationTool = SmcEmulator.ConfigurationToolImpl(configuration.getName(), configuration)
+        self.executionContextTool = SmcEmulator.ExecutionContextToolImpl(name=executionContext.getName(), type=executionContext.getType())
+        self.process = SmcEmulator.Process(self.configurationTool, module)
+        # upstream node of every source, None for sources outside the graph
+        # type: List[GraphNode]
+        self.upstream = []
+        # nodes reading this one through an event driven source
+        # type: List[GraphNode]
+        self.triggers = []
+        self.eventDriven = any(source.eventDriven for source in executionContext.sources)
+        # time the node was queued by an upstream output, None while idle
+        self.queuedTime = None
+        self.history = SourceHistory()
+        # history sequence already read, per source
+        self.cursors = [0] * len(executionContext.sources)
+        self.level = 0
+        # messages of the last tick, shared by all downstream nodes
+        self.action = SmcEmulator.Action(None)
+        self.ticks = 0
+        self.skipped = 0
+        self.seconds = 0.0
+        self.countMessages = 0
+
+    def getName(self):
+        return self.configuration.getName()
+
+    def execute(self):
+        # type: () -> List[SMCApi.IMessage]
+        input = []
+        for i, (source, upstream) in enumerate(zip(self.executionContext.sources, self.upstream)):
+            if upstream is not None:
+                actions, self.cursors[i] = upstream.history.read(source.getGetType(), source.getCountLast(), self.cursors[i])
+                input.append(actions)
+            elif source.valueSource is not None:
+                input.append([SmcEmulator.Action([SmcEmulator.Message(source.valueSource)])])
+            else:
+                input.append([])
+        self.executionContextTool.input = input
+        startTime = time.time()
+        result = self.process.execute(self.executionContextTool)
+        self.seconds += time.time() - startTime
+        self.ticks += 1
+        action = SmcEmulator.Action(None)
+        action.messages = result[1:-1]
+        self.action = action
+        if action.messages:
+            self.history.append(action)
+        self.countMessages += len(action.messages)
+        return result
+
+
+class GraphExecutor(object):
+    # runs configurations wired through their execution context sources, nodes of one level run in parallel
+    def __init__(self, workers=1, historySize=1024):
+        # type: (int, int) -> None
+        if workers < 1:
+            raise SMCApi.ModuleException("workers")
+        self.workers = workers
+        self.historySize = historySize
+        self.queueDepth = 0
+        self.queueDepthMax = 0
+        # running aggregates of the wakeup latencies, the distribution goes to the smc_wakeup_seconds histogram of the metrics
+        self.wakeups = 0
+        self.latencySum = 0.0
+        self.latencyMax = 0.0
+        # type: List[GraphNode]
+        self.nodes = []
+        # type: List[List[GraphNode]]
+        self.levels = None
+        self.pool = None
+
+    def addNode(self, configuration, module, executionContext=None):
+        # type: (Configuration, SMCApi.Module, ExecutionContext) -> GraphNode
+        node = GraphNode(configuration, module, executionContext)
+        self.nodes.append(node)
+        self.levels = None
+        return node
+
+    def build(self):
+        # type: () -> List[List[GraphNode]]
+        byConfiguration = dict((id(node.configuration), node) for node in self.nodes)
+        byExecutionContext = dict((id(node.executionContext), node) for node in self.nodes)
+        capacities = {}
+        for node in self.nodes:
+            node.upstream = []
+            node.triggers = []
+            node.cursors = [0] * len(node.executionContext.sources)
+            # sources may have changed since addNode
+            node.eventDriven = any(source.eventDriven for source in node.executionContext.sources)
+        for node in self.nodes:
+            for source in node.executionContext.sources:
+                upstream = None
+                if source.executionContextSource is not None:
+                    upstream = byExecutionContext.get(id(source.executionContextSource))
+                elif source.configurationSource is not None:
+                    upstream = byConfiguration.get(id(source.configurationSource))
+                else:
+                    node.upstream.append(None)
+                    continue
+                if upstream is None:
+                    raise SMCApi.ModuleException("source of {} is not a node of the graph".format(node.getName()))
+                node.upstream.append(upstream)
+                capacities[id(upstream)] = max(capacities.get(id(upstream), 1),
+                                               SourceHistory.getCapacity(source.getGetType(), source.getCountLast(), self.historySize))
+                if source.eventDriven and node not in upstream.triggers:
+                    upstream.triggers.append(node)
+        for node in self.nodes:
+            node.history = SourceHistory(capacities.get(id(node), 1))
+        dependencies = dict((id(node), set(id(upstream) for upstream in node.upstream if upstream is not None)) for node in self.nodes)
+        remaining = dict((nodeId, len(upstreamIds)) for nodeId, upstreamIds in dependencies.iteritems())
+        downstream = dict((id(node), []) for node in self.nodes)
+        for node in self.nodes:
+            for upstreamId in dependencies[id(node)]:
+                downstream[upstreamId].append(node)
+        levels = []
+        level = [node for node in self.nodes if remaining[id(node)] == 0]
+        scheduled = 0
+        while level:
+            for node in level:
+                node.level = len(levels)
+            levels.append(level)
+            scheduled += len(level)
+            nextLevel = []
+            for node in level:
+                for child in downstream[id(node)]:
+                    remaining[id(child)] -= 1
+                    if remaining[id(child)] == 0:
+                        nextLevel.append(child)
+            level = nextLevel
+        if scheduled != len(self.nodes):
+            raise SMCApi.ModuleException("graph has a cycle")
+        self.levels = levels
+        return levels
+
+    def map(self, function, nodes):
+        if self.workers == 1 or len(nodes) == 1:
+            return [function(node) for node in nodes]
+        if self.pool is None:
+            from multiprocessing.pool import ThreadPool
+            self.pool = ThreadPool(self.workers)
+        return self.pool.map(function, nodes)
+
+    def start(self):
+        # type: () -> Dict[str, List[SMCApi.IMessage]]
+        if self.levels is None:
+            self.build()
+        return dict((node.getName(), node.process.start()) for node in self.nodes)
+
+    def runTick(self):
+        # type: () -> Dict[str, List[SMCApi.IMessage]]
+        if self.levels is None:
+            self.build()
+        result = {}
+        for level in self.levels:
+            # event driven nodes run only when an upstream output queued them
+            ready = []
+            for node in level:
+                if not node.eventDriven or node.queuedTime is not None:
+                    ready.append(node)
+                else:
+                    node.skipped += 1
+                    node.action = SmcEmulator.Action(None)
+            if not ready:
+                continue
+            now = time.time()
+            for node in ready:
+                if node.queuedTime is not None:
+                    latency = now - node.queuedTime
+                    self.wakeups += 1
+                    self.latencySum += latency
+                    self.latencyMax = max(self.latencyMax, latency)
+                    self.queueDepth -= 1
+                    node.queuedTime = None
+                    if SmcEmulator.metrics is not None:
+                        SmcEmulator.metrics.observe("smc_wakeup_seconds", latency)
+            for node, messages in zip(ready, self.map(GraphNode.execute, ready)):
+                result[node.getName()] = messages
+                if node.action.messages:
+                    self.trigger(node)
+        return result
+
+    def trigger(self, node):
+        # type: (GraphNode) -> None
+        now = time.time()
+        for child in node.triggers:
+            if child.queuedTime is None:
+                child.queuedTime = now
+                self.queueDepth += 1
+                self.queueDepthMax = max(self.queueDepthMax, self.queueDepth)
+
+    def stop(self):
+        # type: () -> Dict[str, List[SMCApi.IMessage]]
+        result = dict((node.getName(), node.process.stop()) for node in self.nodes)
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        return result
+
+    def run(self, ticks=1):
+        # type: (int) -> List[Dict[str, List[SMCApi.IMessage]]]
+        self.start()
+        try:
+            return [self.runTick() for _ in range(ticks)]
+        finally:
+            self.stop()
+
+    def getStatistics(self):
+        # type: () -> Dict[str, Dict[str, float]]
+        statistics = {}
+        for node in self.nodes:
+            statistics[node.getName()] = {
+                "level": node.level,
+                "ticks": node.ticks,
+                "seconds": node.seconds,
+                "messages": node.countMessages,
+                "messagesPerSecond": node.countMessages / node.seconds if node.seconds > 0 else 0.0,
+                "skipped": node.skipped,
+            }
+        return statistics
+
+    def getEventStatistics(self):
+        # type: () -> Dict[str, float]
+        return {
+            "wakeups": self.wakeups,
+            "queueDepth": self.queueDepth,
+            "queueDepthMax": self.queueDepthMax,
+            "latencyAvg": self.latencySum / self.wakeups if self.wakeups else 0.0,
+            "latencyMax": self.latencyMax,
+        }
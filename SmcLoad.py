@@ -0,0 +1,135 @@
+"""
+seeded synthetic load for smc modules: generated ticks, chunks, file input stores and a feed loop for Process.execute
+"""
+import datetime
+from __builtin__ import long
+
+import SMCApi
+import SmcEmulator
+
+MYPY = False
+if MYPY:
+    from typing import Dict, List, Callable, Iterator
+    from SmcEmulator import ExecutionContextToolImpl, FileInputStore, Process
+
+
+class LoadGenerator(object):
+    # seeded synthetic input, every tick is generated independently from (seed, tick)
+    valueTypes = ("string", "integer", "long", "double", "bytes", "boolean")
+
+    def __init__(self, seed=0, countSources=1, messagesPerTick=1, messagesPerAction=1, typeMix=None, valueSizes=(1, 16),
+                 errorRatio=0.0, startDate=None, tickInterval=datetime.timedelta(seconds=1)):
+        # type: (int, int, int, int, Dict[str, float], tuple, float, datetime.datetime, datetime.timedelta) -> None
+        if countSources < 1:
+            raise SMCApi.ModuleException("countSources")
+        if messagesPerTick < 0 or messagesPerAction < 1:
+            raise SMCApi.ModuleException("messagesPerTick")
+        if errorRatio < 0 or errorRatio > 1:
+            raise SMCApi.ModuleException("errorRatio")
+        if not typeMix:
+            typeMix = {"string": 1.0}
+        for valueType in typeMix:
+            if valueType not in LoadGenerator.valueTypes:
+                raise SMCApi.ModuleException("typeMix")
+        self.seed = seed
+        self.countSources = countSources
+        self.messagesPerTick = messagesPerTick
+        self.messagesPerAction = messagesPerAction
+        self.types = sorted(typeMix)
+        total = float(sum(typeMix[valueType] for valueType in self.types))
+        self.weights = []
+        weight = 0.0
+        for valueType in self.types:
+            weight += typeMix[valueType] / total
+            self.weights.append(weight)
+        self.valueSizes = valueSizes
+        self.errorRatio = errorRatio
+        if startDate is None:
+            startDate = datetime.datetime(2000, 1, 1)
+        self.startDate = startDate
+        self.tickInterval = tickInterval
+
+    @classmethod
+    def fromSpec(cls, spec):
+        # type: (Dict[str, object]) -> LoadGenerator
+        return cls(seed=spec.get("seed", 0), countSources=spec.get("sources", 1), messagesPerTick=spec.get("rate", 1),
+                   messagesPerAction=spec.get("batch", 1), typeMix=spec.get("mix"), valueSizes=tuple(spec.get("sizes", (1, 16))),
+                   errorRatio=spec.get("errors", 0.0))
+
+    def getSize(self, rnd):
+        if callable(self.valueSizes):
+            return max(0, int(self.valueSizes(rnd)))
+        return rnd.randint(self.valueSizes[0], self.valueSizes[1])
+
+    def createValue(self, rnd):
+        # type: (object) -> Value
+        point = rnd.random()
+        valueType = self.types[-1]
+        for i, weight in enumerate(self.weights):
+            if point < weight:
+                valueType = self.types[i]
+                break
+        if valueType == "string":
+            return SmcEmulator.Value("".join(chr(rnd.randint(97, 122)) for _ in range(self.getSize(rnd))))
+        elif valueType == "integer":
+            return SmcEmulator.Value(int(rnd.randint(-2 ** 31, 2 ** 31 - 1)))
+        elif valueType == "long":
+            return SmcEmulator.Value(long(rnd.randint(-2 ** 63, 2 ** 63 - 1)), SMCApi.ValueType.LONG)
+        elif valueType == "double":
+            return SmcEmulator.Value(rnd.uniform(-1e6, 1e6))
+        elif valueType == "bytes":
+            return SmcEmulator.Value(bytearray(rnd.getrandbits(8) for _ in range(self.getSize(rnd))))
+        return SmcEmulator.Value(rnd.random() < 0.5)
+
+    def generateTick(self, tick):
+        # type: (int) -> List[List[SMCApi.IAction]]
+        import hashlib
+        import random
+        # a digest of the pair, string seeds would depend on hash randomization and arithmetic ones collide
+        rnd = random.Random(long(hashlib.sha1("{}:{}".format(self.seed, tick)).hexdigest(), 16))
+        date = self.startDate + self.tickInterval * tick
+        input = []
+        for _ in range(self.countSources):
+            actions = []
+            remaining = self.messagesPerTick
+            while remaining > 0:
+                count = min(remaining, self.messagesPerAction)
+                remaining -= count
+                messages = [SmcEmulator.Message(self.createValue(rnd), SMCApi.MessageType.DATA, date) for _ in range(count)]
+                if self.errorRatio > 0 and rnd.random() < self.errorRatio:
+                    messages.append(SmcEmulator.Message(SmcEmulator.Value("generated error"), SMCApi.MessageType.ERROR, date))
+                actions.append(SmcEmulator.Action(messages, SMCApi.ActionType.EXECUTE))
+            input.append(actions)
+        return input
+
+    def ticks(self, count=-1, start=0):
+        # type: (int, int) -> Iterator[List[List[SMCApi.IAction]]]
+        tick = start
+        while count < 0 or tick < start + count:
+            yield self.generateTick(tick)
+            tick += 1
+
+    def chunks(self, count, chunkSize, start=0):
+        # type: (int, int, int) -> Iterator[List[List[List[SMCApi.IAction]]]]
+        for chunkStart in range(start, start + count, chunkSize):
+            yield [self.generateTick(tick) for tick in range(chunkStart, min(chunkStart + chunkSize, start + count))]
+
+    def toFileInputStore(self, count, fileName=None, start=0):
+        # type: (int, str, int) -> FileInputStore
+        store = SmcEmulator.FileInputStore(fileName, self.countSources)
+        for input in self.ticks(count, start):
+            for sourceId, actions in enumerate(input):
+                store.extend(sourceId, actions)
+        return store
+
+    def feed(self, process, executionContextTool, count, callback=None, start=0):
+        # type: (Process, ExecutionContextToolImpl, int, Callable[[List[SMCApi.IMessage]], None], int) -> List[List[SMCApi.IMessage]]
+        results = []
+        for input in self.ticks(count, start):
+            executionContextTool.input = input
+            messages = process.execute(executionContextTool)
+            if callback is not None:
+                callback(messages)
+            else:
+                results.append(messages)
+        return results
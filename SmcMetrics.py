@@ -0,0 +1,182 @@
+"""
+metrics of the emulator: message counters and latency histograms, written as json or in the prometheus text format
+metrics are collected only between enableMetrics() and disableMetrics()
+"""
+import bisect
+import threading
+
+import SMCApi
+import SmcEmulator
+
+MYPY = False
+if MYPY:
+    from typing import Dict, List
+
+
+class Histogram(object):
+    defaultBuckets = (0.00001, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+    def __init__(self, buckets=None):
+        # type: (List[float]) -> None
+        if buckets:
+            self.buckets = tuple(sorted(buckets))
+        else:
+            self.buckets = Histogram.defaultBuckets
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        # type: (float) -> None
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry(object):
+    # counters and histograms keyed by (name, label), the label is exported under the label name of its metric
+    # modules of parallel threads record at the same time, every access goes through the lock
+    def __init__(self, buckets=None):
+        # type: (List[float]) -> None
+        self.buckets = buckets
+        # type: Dict[tuple, float]
+        self.counters = {}
+        # type: Dict[tuple, Histogram]
+        self.histograms = {}
+        # metric name -> label name
+        # type: Dict[str, str]
+        self.labelNames = {}
+        self.lock = threading.Lock()
+
+    def increment(self, name, label=None, value=1, labelName="type"):
+        # type: (str, str, float, str) -> None
+        key = (name, label)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            self.labelNames[name] = labelName
+
+    def observe(self, name, value, label=None, labelName="type"):
+        # type: (str, float, str, str) -> None
+        key = (name, label)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = Histogram(self.buckets)
+                self.histograms[key] = histogram
+                self.labelNames[name] = labelName
+            histogram.observe(value)
+
+    def recordMessage(self, message):
+        # type: (SMCApi.IMessage) -> None
+        messageType = message.getMessageType()
+        label = getattr(messageType, "name", str(messageType))
+        self.increment("smc_messages_total", label)
+        self.increment("smc_message_bytes_total", label, SmcEmulator.estimateMessageSize(message))
+
+    def getCounter(self, name, label=None):
+        # type: (str, str) -> float
+        with self.lock:
+            return self.counters.get((name, label), 0)
+
+    def getHistogram(self, name, label=None):
+        # type: (str, str) -> Histogram
+        with self.lock:
+            return self.histograms.get((name, label))
+
+    def snapshot(self):
+        # type: () -> tuple
+        # copies of the counters, histograms and label names, taken under the lock
+        with self.lock:
+            histograms = {}
+            for key, histogram in self.histograms.iteritems():
+                copy = Histogram(histogram.buckets)
+                copy.counts = list(histogram.counts)
+                copy.sum = histogram.sum
+                copy.count = histogram.count
+                histograms[key] = copy
+            return dict(self.counters), histograms, dict(self.labelNames)
+
+    def toDict(self):
+        # type: () -> Dict[str, object]
+        counters, histograms, labelNames = self.snapshot()
+        counterValues = {}
+        for (name, label), value in counters.iteritems():
+            counterValues.setdefault(name, {})[label or ""] = value
+        histogramValues = {}
+        for (name, label), histogram in histograms.iteritems():
+            histogramValues.setdefault(name, {})[label or ""] = {
+                "buckets": list(histogram.buckets),
+                "counts": list(histogram.counts),
+                "sum": histogram.sum,
+                "count": histogram.count,
+            }
+        return {"counters": counterValues, "histograms": histogramValues, "labels": labelNames}
+
+    def writeJson(self, fileName):
+        # type: (str) -> None
+        import json
+        f = open(fileName, "w")
+        try:
+            json.dump(self.toDict(), f, indent=2, sort_keys=True)
+        finally:
+            f.close()
+
+    @staticmethod
+    def formatLabels(label, extra=None, labelName="type"):
+        # type: (str, str, str) -> str
+        labels = []
+        if label is not None:
+            labels.append('{}="{}"'.format(labelName, str(label).replace("\\", "\\\\").replace('"', '\\"')))
+        if extra is not None:
+            labels.append(extra)
+        if not labels:
+            return ""
+        return "{" + ",".join(labels) + "}"
+
+    def toPrometheus(self):
+        # type: () -> str
+        counters, histograms, labelNames = self.snapshot()
+        lines = []
+        for name in sorted(set(name for name, _ in counters)):
+            lines.append("# TYPE {} counter".format(name))
+            labelName = labelNames.get(name, "type")
+            for (counterName, label), value in sorted(counters.iteritems()):
+                if counterName == name:
+                    lines.append("{}{} {}".format(name, self.formatLabels(label, labelName=labelName), value))
+        for name in sorted(set(name for name, _ in histograms)):
+            lines.append("# TYPE {} histogram".format(name))
+            labelName = labelNames.get(name, "type")
+            for (histogramName, label), histogram in sorted(histograms.iteritems()):
+                if histogramName != name:
+                    continue
+                count = 0
+                for bound, bucketCount in zip(histogram.buckets, histogram.counts):
+                    count += bucketCount
+                    lines.append("{}_bucket{} {}".format(name, self.formatLabels(label, 'le="{}"'.format(repr(bound)), labelName), count))
+                lines.append("{}_bucket{} {}".format(name, self.formatLabels(label, 'le="+Inf"', labelName), histogram.count))
+                lines.append("{}_sum{} {}".format(name, self.formatLabels(label, labelName=labelName), repr(histogram.sum)))
+                lines.append("{}_count{} {}".format(name, self.formatLabels(label, labelName=labelName), histogram.count))
+        return "\n".join(lines) + "\n"
+
+    def writePrometheus(self, fileName):
+        # type: (str) -> None
+        f = open(fileName, "w")
+        try:
+            f.write(self.toPrometheus())
+        finally:
+            f.close()
+
+
+def enableMetrics(registry=None):
+    # type: (MetricsRegistry) -> MetricsRegistry
+    if registry is None:
+        registry = MetricsRegistry()
+    SmcEmulator.metrics = registry
+    return registry
+
+
+def disableMetrics():
+    # type: () -> MetricsRegistry
+    registry = SmcEmulator.metrics
+    SmcEmulator.metrics = None
+    return registry
@@ -0,0 +1,279 @@
+"""
+compact output of smc modules: run length encoded messages, streamed runs files and block by block diffs of two outputs
+TickHistory keeps the last ticks of a process with their input, compact output and variable changes
+usage: Process(configurationTool, module, history=TickHistory(100, latencyThreshold=0.5))
+"""
+import array
+import collections
+import itertools
+import os.path
+import time
+from __builtin__ import unicode
+
+import SMCApi
+import SmcEmulator
+
+MYPY = False
+if MYPY:
+    from typing import Dict, List, Iterator
+    from SmcEmulator import ConfigurationToolImpl, ExecutionContextToolImpl
+
+
+class CompactOutput(object):
+    # run length encoded messages, equal consecutive messages are stored once with a count
+    # the ACTION_START and ACTION_STOP markers around every Process call are not stored, each block keeps its count of runs and its markers
+    # strings and message keys are interned, message dates are not kept
+    startKey = (SMCApi.MessageType.ACTION_START, SMCApi.ValueType.INTEGER, 1)
+    stopKey = (SMCApi.MessageType.ACTION_STOP, SMCApi.ValueType.INTEGER, 1)
+
+    def __init__(self, messages=None):
+        # type: (List[SMCApi.IMessage]) -> None
+        # (message type, value type, value) of the runs inside the blocks
+        # type: List[tuple]
+        self.keys = []
+        self.counts = array.array("l")
+        # per block the count of its runs and its markers, 1 for ACTION_START and 2 for ACTION_STOP
+        # messages outside of the markers are kept in blocks without markers
+        self.blockRuns = array.array("l")
+        self.blockMarkers = array.array("b")
+        self.open = False
+        self.interned = {}
+        self.size = 0
+        if messages is not None:
+            self.extend(messages)
+
+    def key(self, messageType, valueType, value):
+        # type: (SMCApi.MessageType, SMCApi.ValueType, object) -> tuple
+        valueClass = type(value)
+        if valueClass is str or valueClass is unicode:
+            value = self.interned.setdefault(value, value)
+        key = (messageType, valueType, value)
+        try:
+            return self.interned.setdefault(key, key)
+        except TypeError:
+            return key
+
+    def appendRun(self, key, count=1):
+        # type: (tuple, int) -> None
+        self.size += count
+        while count:
+            if not self.open and key == CompactOutput.startKey:
+                self.blockRuns.append(0)
+                self.blockMarkers.append(1)
+                self.open = True
+                count -= 1
+            elif self.open and key == CompactOutput.stopKey:
+                self.blockMarkers[-1] |= 2
+                self.open = False
+                count -= 1
+            else:
+                if not self.blockMarkers or (not self.open and self.blockMarkers[-1]):
+                    self.blockRuns.append(0)
+                    self.blockMarkers.append(0)
+                if self.blockRuns[-1] and self.keys[-1] == key:
+                    self.counts[-1] += count
+                else:
+                    self.keys.append(self.key(*key))
+                    self.counts.append(count)
+                    self.blockRuns[-1] += 1
+                break
+
+    def append(self, message):
+        # type: (SMCApi.IMessage) -> None
+        self.appendRun((message.getMessageType(), message.getType(), message.getValue()))
+
+    def extend(self, messages):
+        # type: (List[SMCApi.IMessage]) -> None
+        for message in messages:
+            self.append(message)
+
+    def __len__(self):
+        return self.size
+
+    def getRunCount(self):
+        # type: () -> int
+        return len(self.keys)
+
+    def getBlockCount(self):
+        # type: () -> int
+        return len(self.blockRuns)
+
+    def iterStored(self):
+        # type: () -> Iterator[tuple]
+        run = 0
+        for runs, markers in itertools.izip(self.blockRuns, self.blockMarkers):
+            if markers & 1:
+                yield CompactOutput.startKey, 1
+            for i in xrange(run, run + runs):
+                yield self.keys[i], self.counts[i]
+            run += runs
+            if markers & 2:
+                yield CompactOutput.stopKey, 1
+
+    def __iter__(self):
+        # type: () -> Iterator[tuple]
+        # runs with the markers put back, the same runs iterRuns yields for the messages
+        return mergeRuns(self.iterStored())
+
+    def messages(self):
+        # type: () -> Iterator[SMCApi.IMessage]
+        for (messageType, valueType, value), count in self:
+            for _ in xrange(count):
+                yield SmcEmulator.Message(SmcEmulator.Value(value, valueType), messageType)
+
+    def write(self, fileName, chunkSize=4096):
+        # type: (str, int) -> None
+        writeRuns(fileName, iter(self), chunkSize)
+
+    @staticmethod
+    def read(fileName):
+        # type: (str) -> CompactOutput
+        output = CompactOutput()
+        for key, count in readRuns(fileName):
+            output.appendRun(key, count)
+        return output
+
+
+def mergeRuns(runs):
+    # type: (Iterator[tuple]) -> Iterator[tuple]
+    # joins consecutive runs of equal messages
+    key = None
+    count = 0
+    for current, currentCount in runs:
+        if count and current == key:
+            count += currentCount
+            continue
+        if count:
+            yield key, count
+        key = current
+        count = currentCount
+    if count:
+        yield key, count
+
+
+def iterRuns(messages):
+    # type: (List[SMCApi.IMessage]) -> Iterator[tuple]
+    # lazy run length encoding of a message stream
+    return mergeRuns(((message.getMessageType(), message.getType(), message.getValue()), 1) for message in messages)
+
+
+def writeRuns(fileName, runs, chunkSize=4096):
+    # type: (str, Iterator[tuple], int) -> None
+    import cPickle
+    with open(fileName, "wb") as f:
+        pickler = cPickle.Pickler(f, cPickle.HIGHEST_PROTOCOL)
+        while True:
+            chunk = list(itertools.islice(runs, chunkSize))
+            if not chunk:
+                break
+            pickler.dump(chunk)
+            # the memo would keep every run of the stream alive
+            pickler.clear_memo()
+
+
+def readRuns(fileName):
+    # type: (str) -> Iterator[tuple]
+    import cPickle
+    with open(fileName, "rb") as f:
+        unpickler = cPickle.Unpickler(f)
+        while True:
+            try:
+                chunk = unpickler.load()
+            except EOFError:
+                return
+            for run in chunk:
+                yield run
+
+
+def iterBlocks(runs):
+    # type: (Iterator[tuple]) -> Iterator[List[tuple]]
+    # splits runs into blocks ending with ACTION_STOP, one block per start/execute/update/stop call
+    block = []
+    for run in runs:
+        block.append(run)
+        if run[0][0] == SMCApi.MessageType.ACTION_STOP:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def diffOutputs(left, right):
+    # type: (object, object) -> Iterator[tuple]
+    # compares two outputs block by block and yields (block index, left block, right block) for every differing block
+    # outputs are CompactOutput objects, message lists or iterators, or file names written by writeRuns
+    def toRuns(output):
+        if isinstance(output, basestring):
+            return readRuns(output)
+        if isinstance(output, CompactOutput):
+            return iter(output)
+        return iterRuns(output)
+
+    for index, (leftBlock, rightBlock) in enumerate(itertools.izip_longest(iterBlocks(toRuns(left)), iterBlocks(toRuns(right)))):
+        if leftBlock != rightBlock:
+            yield index, leftBlock, rightBlock
+
+
+class TickHistory(object):
+    # ring buffer of the last ticks of a process: input actions of the sources read, output runs, variable changes and time
+    # inputs are kept as (actions, count) references and outputs as CompactOutput, getTicks and dump turn both into lists
+    # the buffer is written to a file on dump() and when a tick takes longer than latencyThreshold seconds
+    def __init__(self, size=100, latencyThreshold=None, directory=None):
+        # type: (int, float, str) -> None
+        if size < 1:
+            raise SMCApi.ModuleException("size")
+        self.ticks = collections.deque(maxlen=size)
+        self.latencyThreshold = latencyThreshold
+        self.directory = directory
+        self.tick = 0
+        # type: List[str]
+        self.dumps = []
+
+    def begin(self, configurationTool, executionContextTool):
+        # type: (ConfigurationToolImpl, ExecutionContextToolImpl) -> None
+        executionContextTool.readSources = {}
+        if isinstance(configurationTool, SmcEmulator.ConfigurationToolImpl):
+            configurationTool.variableDeltas = []
+
+    def end(self, configurationTool, executionContextTool, output, seconds):
+        # type: (ConfigurationToolImpl, ExecutionContextToolImpl, List[SMCApi.IMessage], float) -> str
+        inputs = executionContextTool.readSources
+        executionContextTool.readSources = None
+        variables = []
+        if isinstance(configurationTool, SmcEmulator.ConfigurationToolImpl):
+            variables = configurationTool.variableDeltas
+            configurationTool.variableDeltas = None
+        self.ticks.append({"tick": self.tick, "time": time.time() - seconds, "seconds": seconds, "inputs": inputs,
+                           "output": CompactOutput(output), "variables": variables})
+        self.tick += 1
+        if self.latencyThreshold is not None and seconds > self.latencyThreshold:
+            return self.dump()
+        return None
+
+    def getTicks(self):
+        # type: () -> List[dict]
+        ticks = []
+        for tick in self.ticks:
+            tick = dict(tick)
+            tick["inputs"] = dict((sourceId, list(actions[:count])) for sourceId, (actions, count) in tick["inputs"].iteritems())
+            tick["output"] = list(tick["output"])
+            ticks.append(tick)
+        return ticks
+
+    def dump(self, fileName=None):
+        # type: (str) -> str
+        import cPickle
+        if fileName is None:
+            directory = self.directory if self.directory is not None else SmcEmulator.getTempDirectory()
+            fileName = os.path.join(directory, "smc_ticks_{}_{}.pickle".format(os.getpid(), self.tick - 1))
+        with open(fileName, "wb") as f:
+            cPickle.dump(self.getTicks(), f, cPickle.HIGHEST_PROTOCOL)
+        self.dumps.append(fileName)
+        return fileName
+
+    @staticmethod
+    def load(fileName):
+        # type: (str) -> List[dict]
+        import cPickle
+        with open(fileName, "rb") as f:
+            return cPickle.load(f)
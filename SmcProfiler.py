@@ -0,0 +1,126 @@
+"""
+stack sampler for module.process calls, the samples are written in the collapsed format of flame graph tools
+usage: Process(configurationTool, module, profiler=StackSampler())
+"""
+import os
+import sys
+import time
+
+import SMCApi
+import SmcEmulator
+
+MYPY = False
+if MYPY:
+    from typing import Dict
+
+
+class StackSampler(object):
+    # samples the stack of module.process calls, "signal" mode works only in the main thread
+    def __init__(self, interval=0.001, mode="signal"):
+        # type: (float, str) -> None
+        if mode not in ("signal", "thread"):
+            raise SMCApi.ModuleException("mode")
+        self.interval = interval
+        self.mode = mode
+        # type: Dict[str, int]
+        self.stacks = {}
+        self.samples = 0
+        self.emulatorSamples = 0
+        self.moduleSamples = 0
+        emulatorFile = os.path.abspath(SmcEmulator.__file__)
+        self.emulatorFile = emulatorFile[:-1] if emulatorFile.endswith(".pyc") else emulatorFile
+        self.libraryPath = os.path.dirname(os.path.abspath(os.__file__))
+        self.stopCode = None
+        self.targetThreadId = None
+        self.thread = None
+        self.running = False
+        self.previousHandler = None
+        # type: Dict[str, str]
+        self.fileKinds = {}
+
+    def getFileKind(self, fileName):
+        # type: (str) -> str
+        kind = self.fileKinds.get(fileName)
+        if kind is None:
+            path = os.path.abspath(fileName)
+            if path == self.emulatorFile:
+                kind = "emulator"
+            elif path.startswith(self.libraryPath):
+                kind = "library"
+            else:
+                kind = "module"
+            self.fileKinds[fileName] = kind
+        return kind
+
+    def sample(self, frame):
+        names = []
+        kind = None
+        while frame is not None and frame.f_code is not self.stopCode:
+            code = frame.f_code
+            frameKind = self.getFileKind(code.co_filename)
+            if kind is None and frameKind != "library":
+                kind = frameKind
+            name = code.co_name
+            if code.co_argcount > 0 and code.co_varnames[0] == "self" and "self" in frame.f_locals:
+                name = "{}.{}".format(type(frame.f_locals["self"]).__name__, name)
+            if frameKind == "emulator":
+                names.append("SmcEmulator:{}".format(name))
+            else:
+                names.append("{}:{}".format(os.path.splitext(os.path.basename(code.co_filename))[0], name))
+            frame = frame.f_back
+        if not names:
+            return
+        stack = ";".join(reversed(names))
+        self.stacks[stack] = self.stacks.get(stack, 0) + 1
+        self.samples += 1
+        if kind == "emulator":
+            self.emulatorSamples += 1
+        else:
+            self.moduleSamples += 1
+
+    def start(self, stopCode=None):
+        # type: (object) -> None
+        self.stopCode = stopCode
+        self.running = True
+        if self.mode == "signal":
+            import signal
+            self.previousHandler = signal.signal(signal.SIGPROF, lambda signum, frame: self.sample(frame))
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        else:
+            import thread
+            import threading
+            self.targetThreadId = thread.get_ident()
+            self.thread = threading.Thread(target=self.run, name="StackSampler")
+            self.thread.daemon = True
+            self.thread.start()
+
+    def run(self):
+        while self.running:
+            time.sleep(self.interval)
+            # noinspection PyProtectedMember
+            frame = sys._current_frames().get(self.targetThreadId)
+            if frame is not None and self.running:
+                self.sample(frame)
+
+    def stop(self):
+        self.running = False
+        if self.mode == "signal":
+            import signal
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            signal.signal(signal.SIGPROF, self.previousHandler or signal.SIG_DFL)
+        elif self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def getSummary(self):
+        # type: () -> Dict[str, int]
+        return {"samples": self.samples, "emulator": self.emulatorSamples, "module": self.moduleSamples}
+
+    def writeCollapsed(self, fileName):
+        # type: (str) -> None
+        f = open(fileName, "w")
+        try:
+            for stack in sorted(self.stacks):
+                f.write("{} {}\n".format(stack, self.stacks[stack]))
+        finally:
+            f.close()
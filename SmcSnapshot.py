@@ -0,0 +1,88 @@
+"""
+snapshots of the emulator state: a configuration tool and an execution context tool are copied once and forked for every run
+sweep runs a module with several settings, in forked worker processes when workers > 1
+"""
+import os
+import sys
+
+import SMCApi
+import SmcEmulator
+
+MYPY = False
+if MYPY:
+    from typing import Dict, List, Callable
+    from SmcEmulator import ConfigurationToolImpl, ExecutionContextToolImpl
+
+
+class EmulatorSnapshot(object):
+    # frozen copy of a configuration tool and an execution context tool, forks share the input lists
+    def __init__(self, configurationTool, executionContextTool):
+        # type: (ConfigurationToolImpl, ExecutionContextToolImpl) -> None
+        import copy
+        self.configurationTool, self.executionContextTool = copy.deepcopy((configurationTool, executionContextTool))
+
+    def fork(self, settings=None):
+        # type: (Dict[str, object]) -> tuple
+        import copy
+        memo = {id(self.executionContextTool.input): self.executionContextTool.input}
+        if isinstance(self.executionContextTool.input, list):
+            for actions in self.executionContextTool.input:
+                memo[id(actions)] = actions
+        configurationTool, executionContextTool = copy.deepcopy((self.configurationTool, self.executionContextTool), memo)
+        if settings:
+            for key, value in settings.iteritems():
+                configurationTool.settings[key] = value if isinstance(value, SmcEmulator.Value) else SmcEmulator.Value(value)
+        return configurationTool, executionContextTool
+
+    def run(self, moduleFactory, settings=None):
+        # type: (Callable[[], SMCApi.Module], Dict[str, object]) -> List[SMCApi.IMessage]
+        configurationTool, executionContextTool = self.fork(settings)
+        return SmcEmulator.Process(configurationTool, moduleFactory()).fullLifeCycle(executionContextTool)
+
+    def sweep(self, moduleFactory, settingsList, workers=0):
+        # type: (Callable[[], SMCApi.Module], List[Dict[str, object]], int) -> List[List[SMCApi.IMessage]]
+        settingsList = list(settingsList)
+        if workers <= 1 or not hasattr(os, "fork") or len(settingsList) < 2:
+            return [self.run(moduleFactory, settings) for settings in settingsList]
+        import cPickle
+        workers = min(workers, len(settingsList))
+        children = []
+        for worker in range(workers):
+            readFd, writeFd = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                os.close(readFd)
+                try:
+                    data = ("ok", [self.run(moduleFactory, settings) for settings in settingsList[worker::workers]])
+                except Exception as e:
+                    data = ("error", "{}: {}".format(type(e).__name__, e))
+                writer = os.fdopen(writeFd, "wb")
+                try:
+                    cPickle.dump(data, writer, cPickle.HIGHEST_PROTOCOL)
+                    writer.close()
+                finally:
+                    # os._exit skips the flush of buffered module logs
+                    try:
+                        sys.stdout.flush()
+                        sys.stderr.flush()
+                    finally:
+                        os._exit(0)
+            os.close(writeFd)
+            children.append((pid, readFd))
+        results = [None] * len(settingsList)
+        errors = []
+        for worker, (pid, readFd) in enumerate(children):
+            reader = os.fdopen(readFd, "rb")
+            try:
+                status, data = cPickle.load(reader)
+            except EOFError:
+                status, data = "error", "worker {} exited without result".format(worker)
+            reader.close()
+            os.waitpid(pid, 0)
+            if status != "ok":
+                errors.append(data)
+                continue
+            results[worker::workers] = data
+        if errors:
+            raise SMCApi.ModuleException("sweep failed: {}".format("; ".join(errors)))
+        return results
@@ -0,0 +1,69 @@
+"""
+startup benchmark for SmcEmulator: per import timings (like -X importtime) and interpreter start plus import time
+usage: python StartupBenchmark.py [runs] [module]
+"""
+import os
+import subprocess
+import sys
+import time
+
+IMPORT_TIME_SCRIPT = r"""
+import sys
+import time
+import __builtin__
+
+original_import = __builtin__.__import__
+stack = []
+lines = []
+
+
+def timed_import(name, *args, **kwargs):
+    if name in sys.modules:
+        return original_import(name, *args, **kwargs)
+    stack.append(0.0)
+    start = time.time()
+    try:
+        return original_import(name, *args, **kwargs)
+    finally:
+        cumulative = time.time() - start
+        children = stack.pop()
+        if stack:
+            stack[-1] += cumulative
+        lines.append((int((cumulative - children) * 1000000), int(cumulative * 1000000), len(stack), name))
+
+
+__builtin__.__import__ = timed_import
+timed_import(sys.argv[1])
+__builtin__.__import__ = original_import
+sys.stderr.write("import time: self [us] | cumulative | imported package\n")
+for self_time, cumulative, level, name in lines:
+    sys.stderr.write("import time: {:>9} | {:>10} | {}{}\n".format(self_time, cumulative, "  " * level, name))
+"""
+
+
+def run(arguments):
+    start = time.time()
+    subprocess.check_call([sys.executable] + arguments, cwd=os.path.dirname(os.path.abspath(__file__)) or None)
+    return time.time() - start
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def main(runs=20, module="SmcEmulator"):
+    run(["-c", IMPORT_TIME_SCRIPT, module])
+    baseline = [run(["-c", "pass"]) for _ in range(runs)]
+    imported = [run(["-c", "import {}".format(module)]) for _ in range(runs)]
+    print "runs: {}".format(runs)
+    print "interpreter start: median {:.2f} ms".format(median(baseline) * 1000)
+    print "start + import {}: median {:.2f} ms".format(module, median(imported) * 1000)
+    print "import overhead: median {:.2f} ms".format((median(imported) - median(baseline)) * 1000)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20, sys.argv[2] if len(sys.argv) > 2 else "SmcEmulator")
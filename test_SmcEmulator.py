@@ -0,0 +1,411 @@
+import gc
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import SMCApi
+import SmcEmulator
+import SmcGraph
+import SmcMetrics
+import SmcOutput
+
+
+class Module(object):
+    def start(self, configurationTool):
+        pass
+
+    def process(self, configurationTool, executionContextTool):
+        executionContextTool.addMessage("value")
+
+    def update(self, configurationTool):
+        configurationTool.setSetting("key", "updated")
+        configurationTool.setVariable("variable", 1)
+
+    def stop(self, configurationTool):
+        pass
+
+
+class ProcessTest(unittest.TestCase):
+    def testUpdateAfterExecuteWithTemporaryTool(self):
+        configurationTool = SmcEmulator.ConfigurationToolImpl()
+        process = SmcEmulator.Process(configurationTool, Module())
+        result = process.execute(SmcEmulator.ExecutionContextToolImpl())
+        gc.collect()
+        self.assertEqual(["value"], [m.getValue() for m in result if m.getMessageType() == SMCApi.MessageType.DATA])
+        result = process.update()
+        self.assertEqual([SMCApi.MessageType.ACTION_START, SMCApi.MessageType.ACTION_STOP], [m.getMessageType() for m in result])
+        self.assertEqual("updated", configurationTool.getSetting("key").getValue())
+        output = configurationTool.executionContextTool.output
+        self.assertEqual([SMCApi.MessageType.CONFIGURATION_CONTROL_CONFIGURATION_SETTING_UPDATE,
+                          SMCApi.MessageType.CONFIGURATION_CONTROL_CONFIGURATION_VARIABLE_UPDATE],
+                         [m.getMessageType() for m in output[-2:]])
+
+    def testInterruptedProcess(self):
+        class BusyModule(Module):
+            def process(self, configurationTool, executionContextTool):
+                startTime = time.time()
+                while time.time() - startTime < 5:
+                    pass
+
+        watchdog = SmcEmulator.Watchdog(interrupt=True)
+        process = SmcEmulator.Process(SmcEmulator.ConfigurationToolImpl(), BusyModule(), watchdog=watchdog)
+        executionContextTool = SmcEmulator.ExecutionContextToolImpl(maxWorkInterval=20)
+        result = process.execute(executionContextTool)
+        errors = [m.getValue() for m in result if m.getMessageType() == SMCApi.MessageType.ACTION_ERROR]
+        self.assertEqual(1, len(errors))
+        self.assertIn("maxWorkInterval 20 ms", errors[0])
+        self.assertIsNone(executionContextTool.deadline)
+        self.assertIsNone(watchdog.timer)
+        self.assertEqual(1, len(watchdog.getOverruns()))
+
+    def testWatchdogEndInterrupted(self):
+        watchdog = SmcEmulator.Watchdog(interrupt=True)
+        executionContextTool = SmcEmulator.ExecutionContextToolImpl(maxWorkInterval=10000)
+        watchdog.begin(executionContextTool)
+        stopTimer = watchdog.stopTimer
+        calls = []
+
+        def interruptedStopTimer():
+            # the exception of the timer arrives inside end before the timer is stopped
+            calls.append(1)
+            if len(calls) == 1:
+                raise SmcEmulator.WorkIntervalExceeded()
+            return stopTimer()
+
+        watchdog.stopTimer = interruptedStopTimer
+        watchdog.end(executionContextTool)
+        self.assertEqual(2, len(calls))
+        self.assertIsNone(executionContextTool.deadline)
+        self.assertIsNone(watchdog.timer)
+
+
+class ObjectArrayBuilderTest(unittest.TestCase):
+    def testMixedRows(self):
+        builder = SmcEmulator.ObjectArrayBuilder([("id", SMCApi.ObjectType.INTEGER), "name"])
+        builder.extend([(1, "a"), {"id": 2, "name": "b"}, {"id": 3}])
+        self.assertEqual([(1, "a"), (2, "b"), (3, None)], [builder.getRow(i) for i in range(builder.size())])
+        self.assertEqual([0], builder.find("name", "a"))
+
+    def testRejectedRows(self):
+        builder = SmcEmulator.ObjectArrayBuilder([("id", SMCApi.ObjectType.INTEGER), "name"])
+        self.assertRaises(SMCApi.ModuleException, builder.extend, [{"id": 1, "name": "a"}, (2,)])
+        self.assertRaises(SMCApi.ModuleException, builder.extend, [(1, "a"), {"id": "b"}])
+        self.assertEqual(0, builder.size())
+        self.assertEqual(0, len(builder.getColumn("id")))
+
+
+class GraphObjectTest(unittest.TestCase):
+    def testControlMessagesWithTemporaryTool(self):
+        executionContext = SmcEmulator.Configuration(SmcEmulator.ExecutionContextToolImpl(), None, SmcEmulator.Module("m"), "a") \
+            .createExecutionContext("ec", "t")
+        self.assertEqual("ec", executionContext.getName())
+        container = SmcEmulator.Container(SmcEmulator.ExecutionContextToolImpl(), "root").createContainer("x")
+        self.assertEqual("x", container.getName())
+
+    def testControlMessagesAfterToolCollected(self):
+        executionContextTool = SmcEmulator.ExecutionContextToolImpl()
+        configuration = executionContextTool.getConfigurationControlTool().createConfiguration(0, None, SmcEmulator.Module("m"), "a")
+        del executionContextTool
+        gc.collect()
+        self.assertIsNone(configuration.executionContextTool)
+        configuration.setSetting("key", "value")
+        configuration.createExecutionContext("ec", "t").createSourceValue(1)
+        self.assertEqual("value", configuration.getSetting("key").getValue())
+
+    def testModulesShareTheDefaultModule(self):
+        module = SmcEmulator.Module("m")
+        configuration = SmcEmulator.Configuration(SmcEmulator.ExecutionContextToolImpl(), None, module, "a")
+        first = SmcEmulator.ExecutionContextToolImpl(managedConfigurations=[configuration])
+        second = SmcEmulator.ExecutionContextToolImpl()
+        self.assertIsNone(first.modules)
+        self.assertEqual(set([module, SmcEmulator.defaultModule]), set(first.getModules()))
+        self.assertEqual([SmcEmulator.defaultModule], second.getModules())
+
+    def testSetExecutionContextToolReachesSources(self):
+        first = SmcEmulator.ExecutionContextToolImpl()
+        second = SmcEmulator.ExecutionContextToolImpl()
+        configuration = SmcEmulator.Configuration(first, None, SmcEmulator.Module("m"), "a")
+        source = configuration.createExecutionContext("ec", "t").createSourceValue(1)
+        configuration.setExecutionContextTool(second)
+        del first
+        gc.collect()
+        source.createFilterObjectPaths(["value"])
+        self.assertEqual([(SMCApi.MessageType.CONFIGURATION_CONTROL_SOURCE_CONTEXT_UPDATE, "a.ec.0")],
+                         [(m.getMessageType(), m.getValue()) for m in second.output])
+
+    def testCountLastOnlyForLastSources(self):
+        executionContextTool = SmcEmulator.ExecutionContextToolImpl()
+        configuration = SmcEmulator.Configuration(executionContextTool, None, SmcEmulator.Module("m"), "a")
+        executionContext = configuration.createExecutionContext("ec", "t")
+        self.assertEqual(0, executionContext.createSourceConfiguration(configuration, SMCApi.SourceGetType.NEW, 0).getCountLast())
+        self.assertRaises(SMCApi.ModuleException, executionContext.createSourceConfiguration, configuration, SMCApi.SourceGetType.LAST, 0)
+
+
+class TactSchedulerTest(unittest.TestCase):
+    def testThreadsCompleteAfterTheirTacts(self):
+        scheduler = SmcEmulator.TactScheduler({0: 2})
+        scheduler.schedule(1, scheduler.getDuration(0, 0), waitingTacts=1)
+        scheduler.schedule(2, scheduler.getDuration(1, 0))
+        self.assertTrue(scheduler.isActive(1))
+        self.assertFalse(scheduler.isActive(2))
+        scheduler.advance(2)
+        self.assertTrue(scheduler.isActive(1))
+        scheduler.advance()
+        self.assertFalse(scheduler.isActive(1))
+        self.assertEqual({"tacts": 3, "active": 0, "completed": 2, "throughput": 2 / 3.0, "latencyAvg": 1.5, "latencyMax": 3},
+                         scheduler.getStatistics())
+
+    def testReleasedThreadIsNotCompleted(self):
+        scheduler = SmcEmulator.TactScheduler(defaultDuration=1)
+        scheduler.schedule(1, scheduler.getDuration(0, 0))
+        scheduler.release(1)
+        scheduler.advance()
+        self.assertEqual(0, scheduler.getStatistics()["completed"])
+        self.assertRaises(SMCApi.ModuleException, scheduler.setDuration, 0, -1)
+
+    def testMeasuredDuration(self):
+        scheduler = SmcEmulator.TactScheduler(measure=True, tactDuration=0.01)
+        self.assertEqual(3, scheduler.getDuration(0, 0.025))
+
+
+class ThreadResultStoreTest(unittest.TestCase):
+    @staticmethod
+    def createAction(value):
+        return SmcEmulator.Action([SmcEmulator.Message(SmcEmulator.Value(value))])
+
+    def testLeastRecentlyUsedEvicted(self):
+        store = SmcEmulator.ThreadResultStore(2)
+        store.put(1, 0, self.createAction(1))
+        store.put(2, 0, self.createAction(2))
+        # reading thread 1 makes thread 2 the least recently used
+        self.assertEqual(1, store.get(1, 0).getMessages()[0].getValue())
+        store.put(3, 0, self.createAction(3))
+        self.assertTrue(store.contains(1, 0))
+        self.assertFalse(store.contains(2))
+        self.assertTrue(store.contains(3))
+        self.assertEqual(1, store.getEvicted())
+        self.assertEqual(2, store.countThreads())
+        self.assertRaises(SMCApi.ModuleException, SmcEmulator.ThreadResultStore, 0)
+
+    def testMemoryUsage(self):
+        store = SmcEmulator.ThreadResultStore()
+        small = self.createAction("a")
+        large = self.createAction("a" * 1000)
+        store.put(1, 0, small)
+        store.put(1, 1, small)
+        store.put(2, 0, small)
+        self.assertEqual(2 * SmcEmulator.estimateActionSize(small), store.getMemoryUsage(1))
+        store.put(1, 1, large)
+        self.assertEqual(SmcEmulator.estimateActionSize(small) + SmcEmulator.estimateActionSize(large), store.getMemoryUsage(1))
+        self.assertEqual(store.getMemoryUsage(1) + store.getMemoryUsage(2), store.getMemoryUsage())
+        store.release(1)
+        self.assertEqual(0, store.getMemoryUsage(1))
+        self.assertEqual(SmcEmulator.estimateActionSize(small), store.getMemoryUsage())
+
+
+class ThreadSafeTest(unittest.TestCase):
+    @staticmethod
+    def runThreads(count, target):
+        threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def testOrderedMerge(self):
+        executionContextTool = SmcEmulator.ExecutionContextToolImpl(threadSafe=True)
+        condition = threading.Condition()
+        turn = [0]
+
+        def add(index):
+            # the threads add in turns, so the order of adding is known
+            for i in range(50):
+                with condition:
+                    while turn[0] % 4 != index:
+                        condition.wait()
+                    executionContextTool.addMessage("{}.{}".format(index, i))
+                    turn[0] += 1
+                    condition.notify_all()
+
+        self.runThreads(4, add)
+        self.assertEqual(["{}.{}".format(i % 4, i // 4) for i in range(200)], [m.getValue() for m in executionContextTool.getOutput()])
+
+    def testUniqueThreadIds(self):
+        executionContextTool = SmcEmulator.ExecutionContextToolImpl(threadSafe=True)
+        threadIds = [None] * 8
+
+        def getThreadId(index):
+            threadIds[index] = executionContextTool.getThreadId()
+            self.assertEqual(threadIds[index], executionContextTool.getThreadId())
+
+        self.runThreads(8, getThreadId)
+        self.assertEqual(8, len(set(threadIds)))
+        self.assertNotIn(executionContextTool.getThreadId(), threadIds)
+
+    def testDeadBuffersDropped(self):
+        executionContextTool = SmcEmulator.ExecutionContextToolImpl(threadSafe=True)
+        self.runThreads(4, lambda index: executionContextTool.addMessage([index] * 10))
+        self.assertEqual(4, len(executionContextTool.threadBuffers))
+        self.assertEqual(40, len(executionContextTool.getOutput()))
+        self.assertEqual([], executionContextTool.threadBuffers)
+        executionContextTool.addMessage("main")
+        executionContextTool.mergeOutput()
+        self.assertEqual(1, len(executionContextTool.threadBuffers))
+        self.assertEqual("main", executionContextTool.output[-1].getValue())
+
+
+class FileInputStoreTest(unittest.TestCase):
+    @staticmethod
+    def createActions(count):
+        # every fourth action is an UPDATE, the message value is the position of the action
+        return [SmcEmulator.Action([SmcEmulator.Message(SmcEmulator.Value(i))],
+                                   SMCApi.ActionType.UPDATE if i % 4 == 3 else SMCApi.ActionType.EXECUTE) for i in range(count)]
+
+    def testRangeReadsOnlyTheRange(self):
+        store = SmcEmulator.FileInputStore.fromInput([self.createActions(2000)])
+        reads = []
+        getAction = store.getAction
+
+        def countingGetAction(sourceId, id):
+            reads.append(id)
+            return getAction(sourceId, id)
+
+        store.getAction = countingGetAction
+        try:
+            actions = SmcEmulator.ExecutionContextToolImpl(store).getMessages(0, 1490, 1500)
+        finally:
+            store.close()
+        self.assertEqual(10, len(reads))
+        self.assertEqual([i for i in range(2000) if i % 4 != 3][1490:1500], [a.getMessages()[0].getValue() for a in actions])
+
+    def testReopen(self):
+        directory = tempfile.mkdtemp()
+        try:
+            fileName = os.path.join(directory, "input.smc")
+            SmcEmulator.FileInputStore.fromInput([self.createActions(8), []], fileName).close()
+            store = SmcEmulator.FileInputStore(fileName)
+            store.append(1, SmcEmulator.Action([SmcEmulator.Message(SmcEmulator.Value("added"))]))
+            store.close()
+            store = SmcEmulator.FileInputStore(fileName)
+            try:
+                self.assertEqual(range(8), [a.getMessages()[0].getValue() for a in store[0]])
+                self.assertEqual(["added"], [a.getMessages()[0].getValue() for a in store[1]])
+                self.assertEqual([3, 7], store.findActions(0, SMCApi.ActionType.UPDATE))
+            finally:
+                store.close()
+            os.remove(fileName + ".index")
+            self.assertRaises(SMCApi.ModuleException, SmcEmulator.FileInputStore, fileName)
+        finally:
+            shutil.rmtree(directory)
+
+
+class Generator(object):
+    # adds its call number on every third call
+    def start(self, configurationTool):
+        self.calls = 0
+
+    def process(self, configurationTool, executionContextTool):
+        self.calls += 1
+        if self.calls % 3 == 0:
+            executionContextTool.addMessage(self.calls)
+
+    def stop(self, configurationTool):
+        pass
+
+
+class GraphExecutorTest(unittest.TestCase):
+    def testEventDrivenWakeups(self):
+        configurations = []
+        for name in ("a", "b"):
+            configuration = SmcEmulator.Configuration(None, None, SmcEmulator.Module(name), name)
+            configuration.createExecutionContext("ec", "default")
+            configurations.append(configuration)
+        configurations[1].getExecutionContext(0).createSourceConfiguration(configurations[0], eventDriven=True)
+        executor = SmcGraph.GraphExecutor()
+        executor.addNode(configurations[0], Generator())
+        executor.addNode(configurations[1], Generator())
+        executor.run(9)
+        statistics = executor.getEventStatistics()
+        self.assertEqual(3, statistics["wakeups"])
+        self.assertEqual(0, statistics["queueDepth"])
+        self.assertTrue(0 <= statistics["latencyAvg"] <= statistics["latencyMax"])
+        self.assertEqual(6, executor.getStatistics()["b"]["skipped"])
+
+
+class MetricsRegistryTest(unittest.TestCase):
+    def tearDown(self):
+        SmcMetrics.disableMetrics()
+
+    def testLabelNames(self):
+        registry = SmcMetrics.enableMetrics()
+        store = SmcEmulator.FileInputStore.fromInput([[SmcEmulator.Action([SmcEmulator.Message(SmcEmulator.Value(1))])]])
+        try:
+            SmcEmulator.ExecutionContextToolImpl(store, name="ec").getMessages(0)
+        finally:
+            store.close()
+        watchdog = SmcEmulator.Watchdog()
+        executionContextTool = SmcEmulator.ExecutionContextToolImpl(name="ec", maxWorkInterval=0)
+        watchdog.begin(executionContextTool)
+        time.sleep(0.01)
+        watchdog.end(executionContextTool)
+        registry.observe("smc_process_seconds", 0.1, "execute")
+        lines = registry.toPrometheus().splitlines()
+        self.assertIn('smc_source_reads_total{source="0"} 1', lines)
+        self.assertIn('smc_work_interval_overruns_total{context="ec"} 1', lines)
+        self.assertIn('smc_process_seconds_count{type="execute"} 1', lines)
+        self.assertEqual("source", registry.toDict()["labels"]["smc_source_reads_total"])
+
+    def testConcurrentIncrements(self):
+        registry = SmcMetrics.MetricsRegistry()
+
+        def record():
+            for _ in range(10000):
+                registry.increment("smc_test_total", "a")
+                registry.observe("smc_test_seconds", 0.001)
+
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(40000, registry.getCounter("smc_test_total", "a"))
+        self.assertEqual(40000, registry.getHistogram("smc_test_seconds").count)
+
+
+class CompactOutputTest(unittest.TestCase):
+    @staticmethod
+    def marker(messageType):
+        return SmcEmulator.Message(SmcEmulator.Value(1), messageType)
+
+    def createBlock(self, values):
+        return [self.marker(SMCApi.MessageType.ACTION_START)] + [SmcEmulator.Message(SmcEmulator.Value(v)) for v in values] + \
+               [self.marker(SMCApi.MessageType.ACTION_STOP)]
+
+    def testMarkersAreNotStored(self):
+        messages = self.createBlock(["a", "a"]) + self.createBlock(["b"]) + self.createBlock(["a", "a", "a"])
+        output = SmcOutput.CompactOutput(messages)
+        self.assertEqual(12, len(output))
+        self.assertEqual(3, output.getRunCount())
+        self.assertEqual(3, output.getBlockCount())
+        self.assertEqual(list(SmcOutput.iterRuns(messages)), list(output))
+        self.assertEqual([], list(SmcOutput.diffOutputs(output, messages)))
+
+    def testEmptyBlocks(self):
+        output = SmcOutput.CompactOutput(self.createBlock([]) * 1000)
+        self.assertEqual(2000, len(output))
+        self.assertEqual(0, output.getRunCount())
+        self.assertEqual(1000, len(list(SmcOutput.iterBlocks(output))))
+
+    def testMarkersOutsideBlocks(self):
+        messages = [self.marker(SMCApi.MessageType.ACTION_STOP), SmcEmulator.Message(SmcEmulator.Value("x"))] + \
+                   self.createBlock([]) + [self.marker(SMCApi.MessageType.ACTION_START)] + self.createBlock(["y"])
+        output = SmcOutput.CompactOutput(messages)
+        self.assertEqual(list(SmcOutput.iterRuns(messages)), list(output))
+        self.assertEqual([(m.getMessageType(), m.getValue()) for m in messages], [(m.getMessageType(), m.getValue()) for m in output.messages()])
+
+
+if __name__ == "__main__":
+    unittest.main()